@@ -8,6 +8,7 @@ from detectionfunctions import LPEnergyODF
 from detectionfunctions import LPSpectralDifferenceODF
 from detectionfunctions import LPComplexODF
 from detectionfunctions import PeakAmpDifferenceODF
+from detectionfunctions import SpectralODFBank
 
 from onsetdetection import OnsetDetection
 from onsetdetection import RTOnsetDetection
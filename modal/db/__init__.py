@@ -8,18 +8,19 @@ onsets_path = os.environ.get(
 )
 
 
-def _sample_and_metadata(db, file_name):
+def _sample_and_metadata(db, file_name, dtype=np.double):
     '''
     Return a dict containing a copy of a sample and all of its metadata.
     '''
     data = {'name': file_name}
-    data['samples'] = np.array(db[file_name], dtype=np.double)
+    data['samples'] = np.array(db[file_name], dtype=dtype)
     for attribute, value in db[file_name].attrs.iteritems():
         data[attribute] = value
     return data
 
 
-def samples(file_name=None, attribute_name=None, attribute_value=None):
+def samples(file_name=None, attribute_name=None, attribute_value=None,
+            dtype=np.double):
     '''
     Return samples from Modal database.
 
@@ -28,19 +29,21 @@ def samples(file_name=None, attribute_name=None, attribute_value=None):
     If not, returns a dict containing dicts of samples and the corresponding
     metadata.
     Samples can optionally be filtered by attribute name and value.
+    Sample values are returned as arrays of type dtype (np.double by
+    default, use np.float32 with single precision ODFs).
     '''
     samples = {}
     db = None
     try:
         db = h5py.File(onsets_path, 'r')
         if file_name:
-            samples = _sample_and_metadata(db, file_name)
+            samples = _sample_and_metadata(db, file_name, dtype)
         else:
             for f in db:
                 if attribute_name and attribute_value:
                     if db[f].attrs[attribute_name] != attribute_value:
                         continue
-                samples[f] = _sample_and_metadata(db, f)
+                samples[f] = _sample_and_metadata(db, f, dtype)
     finally:
         if db:
             db.close()
@@ -83,9 +86,9 @@ def num_onsets():
     return num_onsets
 
 
-def get_audio_file(file_name):
+def get_audio_file(file_name, dtype=np.double):
     '''
     Get a given audio file from the onset database.
     '''
-    sample = samples(file_name)
+    sample = samples(file_name, dtype=dtype)
     return (sample['samples'], sample['sampling_rate'], sample['onsets'])
@@ -2,6 +2,7 @@
 from detectionfunctions import OnsetDetectionFunction
 from detectionfunctions import LinearPredictionODF
 from detectionfunctions import PeakODF
+from detectionfunctions import SpectralODFBank
 
 # try to import the onset detection functions from the c extension module
 try:
@@ -1,3 +1,7 @@
+#include <pthread.h>
+#include <unistd.h>
+#include <algorithm>
+#include <vector>
 #include "detectionfunctions.h"
 #include "mq.h"
 
@@ -13,17 +17,259 @@ void hann_window(int window_size, sample* window) {
 	}
 }
 
+// ----------------------------------------------------------------------------
+// FFT planning
+
+static int fft_planning_flag = FFTW_ESTIMATE;
+static std::string fft_wisdom_file;
+
+// The FFTW planner (including wisdom and plan destruction) is not thread
+// safe, and ODFs can be created, resized, cloned and destroyed on any thread
+// while the GIL is released, so every call to it holds this lock.
+static pthread_mutex_t fft_planner_lock = PTHREAD_MUTEX_INITIALIZER;
+
+class FFTPlannerLock {
+    public:
+        FFTPlannerLock() { pthread_mutex_lock(&fft_planner_lock); }
+        ~FFTPlannerLock() { pthread_mutex_unlock(&fft_planner_lock); }
+};
+
+// number of frames transformed together by process_frames
+static const int fft_batch_size = 16;
+
+int get_fft_planning_flag() {
+    return fft_planning_flag;
+}
+
+void set_fft_planning_flag(int flag) {
+    if(flag != FFTW_ESTIMATE && flag != FFTW_MEASURE &&
+       flag != FFTW_PATIENT && flag != FFTW_EXHAUSTIVE) {
+        throw Exception("Unknown FFT planning flag");
+    }
+    fft_planning_flag = flag;
+}
+
+const char* get_fft_wisdom_file() {
+    return fft_wisdom_file.c_str();
+}
+
+void set_fft_wisdom_file(const char* file_name) {
+    FFTPlannerLock lock;
+    fft_wisdom_file = file_name ? file_name : "";
+    if(!fft_wisdom_file.empty()) {
+        // the file does not have to exist yet
+        FFTW(import_wisdom_from_filename)(fft_wisdom_file.c_str());
+    }
+}
+
+bool import_fft_wisdom(const char* file_name) {
+    FFTPlannerLock lock;
+    return FFTW(import_wisdom_from_filename)(file_name) != 0;
+}
+
+// Write wisdom to a temporary file in the same directory, then rename it to
+// file_name, so that other processes importing the file never see a partly
+// written file. Must be called with the planner lock held.
+static bool write_fft_wisdom(const char* file_name) {
+    std::string temp_file_name = std::string(file_name) + ".XXXXXX";
+    std::vector<char> temp_name(temp_file_name.begin(), temp_file_name.end());
+    temp_name.push_back('\0');
+
+    int fd = mkstemp(&temp_name[0]);
+    if(fd < 0) {
+        return false;
+    }
+    FILE* temp_file = fdopen(fd, "w");
+    if(!temp_file) {
+        close(fd);
+        unlink(&temp_name[0]);
+        return false;
+    }
+    FFTW(export_wisdom_to_file)(temp_file);
+    bool written = !ferror(temp_file);
+    written = (fclose(temp_file) == 0) && written;
+    if(!written || rename(&temp_name[0], file_name) != 0) {
+        unlink(&temp_name[0]);
+        return false;
+    }
+    return true;
+}
+
+bool export_fft_wisdom(const char* file_name) {
+    FFTPlannerLock lock;
+    return write_fft_wisdom(file_name);
+}
+
+// Plans are first looked up in the existing wisdom, and the wisdom file is
+// only rewritten when a new plan has to be measured. Must be called with the
+// planner lock held.
+static bool saving_fft_wisdom() {
+    return fft_planning_flag != FFTW_ESTIMATE && !fft_wisdom_file.empty();
+}
+
+// Return a plan for the real FFT of frame_size samples from in to out.
+// Planning with anything other than FFT_ESTIMATE overwrites in and out,
+// unless the plan is already in the wisdom.
+FFTW(plan) plan_fft(int frame_size, sample* in, FFTW(complex)* out) {
+    FFTPlannerLock lock;
+    FFTW(plan) p = NULL;
+    if(saving_fft_wisdom()) {
+        p = FFTW(plan_dft_r2c_1d)(frame_size, in, out,
+                                  fft_planning_flag | FFTW_WISDOM_ONLY);
+    }
+    if(!p) {
+        p = FFTW(plan_dft_r2c_1d)(frame_size, in, out, fft_planning_flag);
+        if(saving_fft_wisdom()) {
+            write_fft_wisdom(fft_wisdom_file.c_str());
+        }
+    }
+    return p;
+}
+
+// Return a plan for the real FFTs of num_frames consecutive blocks of
+// frame_size samples in in. The spectra are written to consecutive blocks
+// of (frame_size / 2) + 1 values in out.
+FFTW(plan) plan_fft_batch(int frame_size, int num_frames,
+                          sample* in, FFTW(complex)* out) {
+    FFTPlannerLock lock;
+    int n[] = {frame_size};
+    int num_bins = (frame_size / 2) + 1;
+    FFTW(plan) p = NULL;
+    if(saving_fft_wisdom()) {
+        p = FFTW(plan_many_dft_r2c)(1, n, num_frames,
+                                    in, NULL, 1, frame_size,
+                                    out, NULL, 1, num_bins,
+                                    fft_planning_flag | FFTW_WISDOM_ONLY);
+    }
+    if(!p) {
+        p = FFTW(plan_many_dft_r2c)(1, n, num_frames,
+                                    in, NULL, 1, frame_size,
+                                    out, NULL, 1, num_bins,
+                                    fft_planning_flag);
+        if(saving_fft_wisdom()) {
+            write_fft_wisdom(fft_wisdom_file.c_str());
+        }
+    }
+    return p;
+}
+
+// Destroy a plan returned by plan_fft or plan_fft_batch.
+void destroy_fft_plan(FFTW(plan) p) {
+    if(p) {
+        FFTPlannerLock lock;
+        FFTW(destroy_plan)(p);
+    }
+}
+
+int init_fft_batch(FFTBatch* batch, int frame_size, int max_frames) {
+    batch->frame_size = frame_size;
+    batch->num_bins = (frame_size / 2) + 1;
+    batch->max_frames = max_frames;
+    batch->in = (sample*) FFTW(malloc)(
+        sizeof(sample) * frame_size * max_frames
+    );
+    batch->out = (FFTW(complex)*) FFTW(malloc)(
+        sizeof(FFTW(complex)) * batch->num_bins * max_frames
+    );
+    batch->p = plan_fft_batch(frame_size, max_frames, batch->in, batch->out);
+    // unused frames at the end of a batch are still transformed
+    memset(batch->in, 0, sizeof(sample) * frame_size * max_frames);
+    return 0;
+}
+
+int destroy_fft_batch(FFTBatch* batch) {
+    if(batch) {
+        if(batch->in) FFTW(free)(batch->in);
+        if(batch->out) FFTW(free)(batch->out);
+        destroy_fft_plan(batch->p);
+        batch->max_frames = 0;
+        batch->in = NULL;
+        batch->out = NULL;
+        batch->p = NULL;
+    }
+    return 0;
+}
+
+// Window and transform up to count consecutive frames, the first starting at
+// signal[start] and each following frame starting hop_size samples later.
+// Returns the number of frames transformed, which is limited by the size of
+// the batch and by the end of the signal.
+int fft_frames(FFTBatch* batch, int signal_size, sample* signal,
+               int start, int hop_size, int count, sample* window) {
+    int frame_size = batch->frame_size;
+    int num_frames = 0;
+
+    while(num_frames < count && num_frames < batch->max_frames &&
+          start + (num_frames * hop_size) <= signal_size - frame_size) {
+        sample* frame = &signal[start + (num_frames * hop_size)];
+        sample* in = &batch->in[num_frames * frame_size];
+        if(window) {
+            for(int i = 0; i < frame_size; i++) {
+                in[i] = frame[i] * window[i];
+            }
+        }
+        else {
+            memcpy(in, frame, sizeof(sample) * frame_size);
+        }
+        num_frames++;
+    }
+
+    if(num_frames) {
+        FFTW(execute)(batch->p);
+    }
+    return num_frames;
+}
+
 // ----------------------------------------------------------------------------
 // Linear Prediction
 
+int init_burg_workspace(BurgWorkspace* workspace, int max_signal_size,
+                        int max_coefs) {
+    workspace->max_signal_size = max_signal_size;
+    workspace->max_coefs = max_coefs;
+    workspace->f = new sample[max_signal_size];
+    workspace->b = new sample[max_signal_size];
+    workspace->temp_coefs = new sample[max_coefs+1];
+    workspace->reversed_coefs = new sample[max_coefs+1];
+    return 0;
+}
+
+int destroy_burg_workspace(BurgWorkspace* workspace) {
+    if(workspace) {
+        if(workspace->f) delete [] workspace->f;
+        if(workspace->b) delete [] workspace->b;
+        if(workspace->temp_coefs) delete [] workspace->temp_coefs;
+        if(workspace->reversed_coefs) delete [] workspace->reversed_coefs;
+        workspace->f = NULL;
+        workspace->b = NULL;
+        workspace->temp_coefs = NULL;
+        workspace->reversed_coefs = NULL;
+    }
+    return 0;
+}
+
 void burg(int signal_size, sample* signal, int order,
 		  int num_coefs, sample* coefs) {
+	BurgWorkspace workspace;
+	init_burg_workspace(&workspace, signal_size, num_coefs);
+	burg(signal_size, signal, order, num_coefs, coefs, &workspace);
+	destroy_burg_workspace(&workspace);
+}
+
+void burg(int signal_size, sample* signal, int order,
+		  int num_coefs, sample* coefs, BurgWorkspace* workspace) {
+	if(signal_size > workspace->max_signal_size ||
+	   num_coefs > workspace->max_coefs) {
+		throw Exception("Burg workspace is too small");
+	}
+
 	// initialise f and b - the forward and backwards predictors
-	sample* f = (sample*)calloc(signal_size, sizeof(sample));
-	sample* b = (sample*)calloc(signal_size, sizeof(sample));
-	sample* temp_coefs = (sample*)calloc(num_coefs+1, sizeof(sample));
-	sample* reversed_coefs = (sample*)calloc(num_coefs+1, sizeof(sample));
+	sample* f = workspace->f;
+	sample* b = workspace->b;
+	sample* temp_coefs = workspace->temp_coefs;
+	sample* reversed_coefs = workspace->reversed_coefs;
 	sample temp;
+	memset(temp_coefs, 0, sizeof(sample)*(num_coefs+1));
 
 	int k;
 	for(k = 0; k < signal_size; k++) {
@@ -76,11 +322,6 @@ void burg(int signal_size, sample* signal, int order,
 	}
 
 	memcpy(coefs, &temp_coefs[1], sizeof(sample)*num_coefs);
-
-	free(f);
-	free(b);
-	free(temp_coefs);
-	free(reversed_coefs);
 }
 
 void linear_prediction(int signal_size, sample* signal,
@@ -130,6 +371,80 @@ void OnsetDetectionFunction::set_hop_size(int value) {
     hop_size = value;
 }
 
+int OnsetDetectionFunction::get_num_threads() {
+    return num_threads;
+}
+
+// Set the number of threads used by process. The signal is split into
+// num_threads ranges of frames, which are processed in parallel.
+void OnsetDetectionFunction::set_num_threads(int value) {
+    if(value < 1) {
+        throw Exception(std::string("Number of threads must be at least 1"));
+    }
+    num_threads = value;
+}
+
+void OnsetDetectionFunction::copy_parameters(OnsetDetectionFunction* odf) {
+    odf->set_sampling_rate(sampling_rate);
+    odf->set_hop_size(hop_size);
+    odf->set_frame_size(frame_size);
+}
+
+OnsetDetectionFunction* OnsetDetectionFunction::clone() {
+    OnsetDetectionFunction* odf = new OnsetDetectionFunction();
+    copy_parameters(odf);
+    return odf;
+}
+
+// Calculate the ODF values of up to count consecutive frames, the first
+// starting at signal[start] and each following frame starting hop_size
+// samples later. The values are written to odf without being normalised, and
+// the ODF state is updated just as if process_frame was called for each
+// frame. Returns the number of frames processed, which is less than count if
+// the end of the signal is reached first.
+int OnsetDetectionFunction::process_frames(int signal_size, sample* signal,
+                                           int start, int count,
+                                           int odf_size, sample* odf) {
+    if(start < 0) {
+        throw Exception(std::string("Start position must not be negative"));
+    }
+    if(odf_size < count) {
+        throw Exception(std::string("ODF size is too small: must be at ") +
+                        std::string("least count"));
+    }
+
+	int sample_offset = start;
+	int frame = 0;
+
+    if(fft_batch.p) {
+        // transform a batch of frames at a time, then process each spectrum
+        int num_bins = fft_batch.num_bins;
+        while(frame < count) {
+            int num_frames = fft_frames(&fft_batch, signal_size, signal,
+                                        sample_offset, hop_size,
+                                        count - frame, window);
+            if(!num_frames) {
+                break;
+            }
+            for(int i = 0; i < num_frames; i++) {
+                odf[frame + i] = process_spectrum(
+                    &fft_batch.out[i * num_bins]
+                );
+            }
+            sample_offset += num_frames * hop_size;
+            frame += num_frames;
+        }
+        return frame;
+    }
+
+	while(frame < count && sample_offset <= signal_size - frame_size) {
+		odf[frame] = process_frame(frame_size, &signal[sample_offset]);
+		sample_offset += hop_size;
+		frame++;
+	}
+	return frame;
+}
+
 void OnsetDetectionFunction::process(int signal_size, sample* signal,
                                      int odf_size, sample* odf) {
     if(odf_size < (signal_size - frame_size) / hop_size) {
@@ -139,20 +454,28 @@ void OnsetDetectionFunction::process(int signal_size, sample* signal,
         return;
     }
 
-    sample odf_max = 0.0;
-	int sample_offset = 0;
-	int frame = 0;
+    int num_frames = 0;
+    if(signal_size >= frame_size) {
+        num_frames = ((signal_size - frame_size) / hop_size) + 1;
+    }
+    if(num_frames > odf_size) {
+        num_frames = odf_size;
+    }
 
-	while(sample_offset <= signal_size - frame_size) {
-		odf[frame] = process_frame(frame_size, &signal[sample_offset]);
+    if(num_threads > 1 && num_frames > 1) {
+        process_frames_threaded(signal_size, signal, num_frames, odf);
+    }
+    else {
+        process_frames(signal_size, signal, 0, num_frames, odf_size, odf);
+    }
 
-		// keep track of the maximum so we can normalise later
-		if(odf[frame] > odf_max) {
-			odf_max = odf[frame];
-		}
-		sample_offset += hop_size;
-		frame++;
-	}
+    // keep track of the maximum so we can normalise
+    sample odf_max = 0.0;
+    for(int i = 0; i < num_frames; i++) {
+        if(odf[i] > odf_max) {
+            odf_max = odf[i];
+        }
+    }
 
 	// normalise ODF
 	if(odf_max) {
@@ -162,9 +485,296 @@ void OnsetDetectionFunction::process(int signal_size, sample* signal,
 	}
 }
 
+// A range of frames that is processed by one thread. Before the first frame
+// in the range, the ODF is warmed up on the previous num_warmup_frames frames
+// so that its state is the same as if every earlier frame had been processed.
+typedef struct FrameRange {
+    OnsetDetectionFunction* odf;
+    int signal_size;
+    sample* signal;
+    int start;
+    int num_warmup_frames;
+    int num_frames;
+    sample* odf_values;
+    std::string error;
+} FrameRange;
+
+static void process_frame_range(FrameRange* range) {
+    OnsetDetectionFunction* odf = range->odf;
+    int hop_size = odf->get_hop_size();
+
+    try {
+        if(range->num_warmup_frames) {
+            std::vector<sample> warmup_values(range->num_warmup_frames);
+            odf->process_frames(
+                range->signal_size, range->signal,
+                (range->start - range->num_warmup_frames) * hop_size,
+                range->num_warmup_frames, range->num_warmup_frames,
+                &warmup_values[0]
+            );
+        }
+        if(range->num_frames) {
+            odf->process_frames(range->signal_size, range->signal,
+                                range->start * hop_size, range->num_frames,
+                                range->num_frames, range->odf_values);
+        }
+    }
+    catch(std::exception& e) {
+        range->error = e.what();
+    }
+}
+
+static void* process_frame_range_thread(void* range) {
+    process_frame_range((FrameRange*)range);
+    return NULL;
+}
+
+// Calculate the first num_frames ODF values of signal, split across
+// num_threads threads. Each thread after the first uses a clone of this ODF,
+// so the values are the same as those calculated by process_frames. Clones
+// plan and destroy their FFTs under the FFTW planner lock (see plan_fft), as
+// other Python threads may be creating or destroying ODFs at the same time.
+int OnsetDetectionFunction::process_frames_threaded(int signal_size,
+                                                    sample* signal,
+                                                    int num_frames,
+                                                    sample* odf) {
+    int num_ranges = num_threads;
+    if(num_ranges > num_frames) {
+        num_ranges = num_frames;
+    }
+    int history_size = get_history_size();
+
+    std::vector<FrameRange> ranges(num_ranges);
+    for(int i = 0; i < num_ranges; i++) {
+        int start = (int)(((long)num_frames * i) / num_ranges);
+        int end = (int)(((long)num_frames * (i + 1)) / num_ranges);
+        ranges[i].odf = i ? clone() : this;
+        ranges[i].signal_size = signal_size;
+        ranges[i].signal = signal;
+        ranges[i].start = start;
+        ranges[i].num_warmup_frames = i ? std::min(history_size, start) : 0;
+        ranges[i].num_frames = end - start;
+        ranges[i].odf_values = &odf[start];
+    }
+
+    // process the first range on this thread, and the rest in new threads
+    std::vector<pthread_t> threads(num_ranges);
+    std::vector<bool> started(num_ranges, false);
+    for(int i = 1; i < num_ranges; i++) {
+        started[i] = pthread_create(&threads[i], NULL,
+                                    process_frame_range_thread,
+                                    &ranges[i]) == 0;
+    }
+    process_frame_range(&ranges[0]);
+    for(int i = 1; i < num_ranges; i++) {
+        if(started[i]) {
+            pthread_join(threads[i], NULL);
+        }
+        else {
+            process_frame_range(&ranges[i]);
+        }
+    }
+    for(int i = 1; i < num_ranges; i++) {
+        delete ranges[i].odf;
+    }
+
+    for(int i = 0; i < num_ranges; i++) {
+        if(!ranges[i].error.empty()) {
+            throw Exception(ranges[i].error);
+        }
+    }
+
+    // leave this ODF in the same state as if it had processed every frame
+    int num_warmup_frames = std::min(history_size, num_frames);
+    if(num_ranges > 1 && num_warmup_frames) {
+        FrameRange range;
+        range.odf = this;
+        range.signal_size = signal_size;
+        range.signal = signal;
+        range.start = num_frames;
+        range.num_warmup_frames = num_warmup_frames;
+        range.num_frames = 0;
+        range.odf_values = NULL;
+        process_frame_range(&range);
+        if(!range.error.empty()) {
+            throw Exception(range.error);
+        }
+    }
+    return num_frames;
+}
+
 // ----------------------------------------------------------------------------
 // Energy
 
+// Greatest common divisor of a and b
+static int gcd(int a, int b) {
+    while(b) {
+        int temp = b;
+        b = a % b;
+        a = temp;
+    }
+    return a;
+}
+
+EnergyODF::EnergyODF() {
+    prev_energy = 0.0;
+    consecutive_frames = false;
+    chunk_energies = NULL;
+    reset_chunks();
+}
+
+EnergyODF::~EnergyODF() {
+    if(chunk_energies) delete [] chunk_energies;
+}
+
+// Frames are split into chunks that evenly divide both the frame and hop
+// sizes. The energy of each chunk in the most recent frame is kept in the
+// circular buffer chunk_energies, so that consecutive frames only have to
+// square the hop_size new samples. If the chunks are so small that summing
+// their energies is as slow as summing the frame (when the frame and hop
+// sizes have no large common factor), frames are summed directly instead.
+void EnergyODF::reset_chunks() {
+    chunk_size = gcd(frame_size, hop_size);
+    num_chunks = frame_size / chunk_size;
+    chunk_index = 0;
+    have_chunk_energies = false;
+    use_chunks = hop_size + num_chunks < frame_size;
+
+    if(chunk_energies) delete [] chunk_energies;
+    chunk_energies = new sample[num_chunks];
+    for(int i = 0; i < num_chunks; i++) {
+        chunk_energies[i] = 0.0;
+    }
+}
+
+OnsetDetectionFunction* EnergyODF::clone() {
+    EnergyODF* odf = new EnergyODF();
+    copy_parameters(odf);
+    return odf;
+}
+
+void EnergyODF::set_frame_size(int value) {
+    frame_size = value;
+    reset_chunks();
+}
+
+void EnergyODF::set_hop_size(int value) {
+    hop_size = value;
+    reset_chunks();
+}
+
+bool EnergyODF::get_consecutive_frames() {
+    return consecutive_frames;
+}
+
+void EnergyODF::set_consecutive_frames(bool value) {
+    consecutive_frames = value;
+    have_chunk_energies = false;
+}
+
+sample EnergyODF::frame_energy(sample* frame) {
+    sample energy = 0.0;
+    int i, j;
+
+    if(!consecutive_frames || !use_chunks) {
+        for(i = 0; i < frame_size; i++) {
+            energy += frame[i] * frame[i];
+        }
+        return energy;
+    }
+
+    // only the last new_chunks chunks of the frame have not been seen before
+    int new_chunks = num_chunks;
+    if(have_chunk_energies && hop_size < frame_size) {
+        new_chunks = hop_size / chunk_size;
+    }
+
+    for(i = num_chunks - new_chunks; i < num_chunks; i++) {
+        sample* chunk = &frame[i * chunk_size];
+        sample chunk_energy = 0.0;
+        for(j = 0; j < chunk_size; j++) {
+            chunk_energy += chunk[j] * chunk[j];
+        }
+        // overwrite the oldest chunk
+        chunk_energies[chunk_index] = chunk_energy;
+        chunk_index = (chunk_index + 1) % num_chunks;
+    }
+    have_chunk_energies = true;
+
+    // sum from the oldest chunk, so that the result does not depend on
+    // where the frame is in the circular buffer
+    for(i = chunk_index; i < num_chunks; i++) {
+        energy += chunk_energies[i];
+    }
+    for(i = 0; i < chunk_index; i++) {
+        energy += chunk_energies[i];
+    }
+    return energy;
+}
+
+// Frames passed to process_frames are always consecutive. The energy of
+// each frame is the difference between two running sums of the squared
+// signal, one up to the start of the frame and one up to its end, so the
+// work per frame does not depend on the frame size. Both sums are
+// accumulated in double precision over the same samples.
+int EnergyODF::process_frames(int signal_size, sample* signal,
+                              int start, int count,
+                              int odf_size, sample* odf) {
+    if(start < 0) {
+        throw Exception(std::string("Start position must not be negative"));
+    }
+    if(odf_size < count) {
+        throw Exception(std::string("ODF size is too small: must be at ") +
+                        std::string("least count"));
+    }
+
+    double sum_to_start = 0.0;
+    double sum_to_end = 0.0;
+    int start_pos = start;
+    int end_pos = start;
+    int frame = 0;
+
+    while(frame < count &&
+          start + (frame * hop_size) <= signal_size - frame_size) {
+        int frame_start = start + (frame * hop_size);
+        int frame_end = frame_start + frame_size;
+        if(end_pos <= frame_start) {
+            // frames do not overlap, so skip to the start of this frame
+            sum_to_start = sum_to_end = 0.0;
+            start_pos = end_pos = frame_start;
+        }
+
+        // both sums usually advance by hop_size samples, so add to them in
+        // the same loop where possible
+        int n = std::min(frame_end - end_pos, frame_start - start_pos);
+        for(int i = 0; i < n; i++) {
+            double x = signal[end_pos + i];
+            double y = signal[start_pos + i];
+            sum_to_end += x * x;
+            sum_to_start += y * y;
+        }
+        end_pos += n;
+        start_pos += n;
+        while(end_pos < frame_end) {
+            double x = signal[end_pos++];
+            sum_to_end += x * x;
+        }
+        while(start_pos < frame_start) {
+            double x = signal[start_pos++];
+            sum_to_start += x * x;
+        }
+
+        sample energy = (sample)(sum_to_end - sum_to_start);
+        odf[frame] = fabs(energy - prev_energy);
+        prev_energy = energy;
+        frame++;
+    }
+
+    // chunk energies are not kept, so the next frame is summed in full
+    have_chunk_energies = false;
+    return frame;
+}
+
 sample EnergyODF::process_frame(int signal_size, sample* signal) {
     if(signal_size != frame_size) {
         printf("Warning: size of signal passed to process_frame (%d) "
@@ -174,14 +784,9 @@ sample EnergyODF::process_frame(int signal_size, sample* signal) {
     }
 
     // calculate signal energy
-    sample energy = 0.0;
-    sample diff;
-    int i;
-    for(i = 0; i < frame_size; i++) {
-        energy += signal[i] * signal[i];
-    }
+    sample energy = frame_energy(signal);
     // get the energy difference between current and previous frame
-    diff = fabs(energy - prev_energy);
+    sample diff = fabs(energy - prev_energy);
     prev_energy = energy;
     return diff;
 }
@@ -193,16 +798,16 @@ SpectralDifferenceODF::SpectralDifferenceODF() {
     prev_amps = NULL;
     in = NULL;
     out = NULL;
-	p = fftw_plan_dft_r2c_1d(frame_size, in, out, FFTW_ESTIMATE);
+    p = NULL;
     reset();
 }
 
 SpectralDifferenceODF::~SpectralDifferenceODF() {
     if(window) delete [] window;
     if(prev_amps) delete [] prev_amps;
-    if(in) fftw_free(in);
-    if(out) fftw_free(out);
-    fftw_destroy_plan(p);
+    if(in) FFTW(free)(in);
+    if(out) FFTW(free)(out);
+    destroy_fft_plan(p);
 }
 
 void SpectralDifferenceODF::reset() {
@@ -221,14 +826,23 @@ void SpectralDifferenceODF::reset() {
         prev_amps[i] = 0;
     }
 
-    if(in) fftw_free(in);
-    in = (sample*) fftw_malloc(sizeof(sample) * frame_size);
+    if(in) FFTW(free)(in);
+    in = (sample*) FFTW(malloc)(sizeof(sample) * frame_size);
+
+    if(out) FFTW(free)(out);
+	out = (FFTW(complex)*) FFTW(malloc)(sizeof(FFTW(complex)) * num_bins);
+
+    destroy_fft_plan(p);
+    p = plan_fft(frame_size, in, out);
 
-    if(out) fftw_free(out);
-	out = (fftw_complex*) fftw_malloc(sizeof(fftw_complex) * num_bins);
+    destroy_fft_batch(&fft_batch);
+    init_fft_batch(&fft_batch, frame_size, fft_batch_size);
+}
 
-    fftw_destroy_plan(p);
-	p = fftw_plan_dft_r2c_1d(frame_size, in, out, FFTW_ESTIMATE);
+OnsetDetectionFunction* SpectralDifferenceODF::clone() {
+    SpectralDifferenceODF* odf = new SpectralDifferenceODF();
+    copy_parameters(odf);
+    return odf;
 }
 
 void SpectralDifferenceODF::set_frame_size(int value) {
@@ -244,19 +858,23 @@ sample SpectralDifferenceODF::process_frame(int signal_size, sample* signal) {
         set_frame_size(signal_size);
     }
 
-    sample sum = 0.0;
-    sample amp;
-    int bin;
-
     // do a FFT of the current frame
     memcpy(in, &signal[0], sizeof(sample)*frame_size);
     window_frame(in);
-    fftw_execute(p);
+    FFTW(execute)(p);
+
+    return process_spectrum(out);
+}
+
+sample SpectralDifferenceODF::process_spectrum(FFTW(complex)* spectrum) {
+    sample sum = 0.0;
+    sample amp;
+    int bin;
 
     // calculate the amplitude differences between bins from consecutive frames
-    sum = 0.0;
     for(bin = 0; bin < num_bins; bin++) {
-        amp = sqrt((out[bin][0]*out[bin][0]) + (out[bin][1]*out[bin][1]));
+        amp = sqrt((spectrum[bin][0]*spectrum[bin][0]) +
+                   (spectrum[bin][1]*spectrum[bin][1]));
         sum += fabs(prev_amps[bin] - amp);
         prev_amps[bin] = amp;
     }
@@ -271,9 +889,20 @@ ComplexODF::ComplexODF() {
     prev_amps = NULL;
     prev_phases = NULL;
     prev_phases2 = NULL;
+    real = NULL;
+    imag = NULL;
+    predicted_real = NULL;
+    predicted_imag = NULL;
+    phasor_prediction = false;
+    prev_real = NULL;
+    prev_imag = NULL;
+    prev_unit_real = NULL;
+    prev_unit_imag = NULL;
+    prev_unit_real2 = NULL;
+    prev_unit_imag2 = NULL;
     in = NULL;
     out = NULL;
-	p = fftw_plan_dft_r2c_1d(frame_size, in, out, FFTW_ESTIMATE);
+    p = NULL;
     reset();
 }
 
@@ -282,9 +911,19 @@ ComplexODF::~ComplexODF() {
     if(prev_amps) delete [] prev_amps;
     if(prev_phases) delete [] prev_phases;
     if(prev_phases2) delete [] prev_phases2;
-    if(in) fftw_free(in);
-    if(out) fftw_free(out);
-    fftw_destroy_plan(p);
+    if(real) delete [] real;
+    if(imag) delete [] imag;
+    if(predicted_real) delete [] predicted_real;
+    if(predicted_imag) delete [] predicted_imag;
+    if(prev_real) delete [] prev_real;
+    if(prev_imag) delete [] prev_imag;
+    if(prev_unit_real) delete [] prev_unit_real;
+    if(prev_unit_imag) delete [] prev_unit_imag;
+    if(prev_unit_real2) delete [] prev_unit_real2;
+    if(prev_unit_imag2) delete [] prev_unit_imag2;
+    if(in) FFTW(free)(in);
+    if(out) FFTW(free)(out);
+    destroy_fft_plan(p);
 }
 
 void ComplexODF::reset() {
@@ -315,14 +954,60 @@ void ComplexODF::reset() {
         prev_phases2[i] = 0;
     }
 
-    if(in) fftw_free(in);
-    in = (sample*) fftw_malloc(sizeof(sample) * frame_size);
+    if(real) delete [] real;
+    real = new sample[num_bins];
+    if(imag) delete [] imag;
+    imag = new sample[num_bins];
+    if(predicted_real) delete [] predicted_real;
+    predicted_real = new sample[num_bins];
+    if(predicted_imag) delete [] predicted_imag;
+    predicted_imag = new sample[num_bins];
+
+    // the phasor state starts with a zero spectrum and unit phasors with a
+    // phase of 0, matching the initial magnitudes and phases
+    if(prev_real) delete [] prev_real;
+    prev_real = new sample[num_bins];
+    if(prev_imag) delete [] prev_imag;
+    prev_imag = new sample[num_bins];
+    if(prev_unit_real) delete [] prev_unit_real;
+    prev_unit_real = new sample[num_bins];
+    if(prev_unit_imag) delete [] prev_unit_imag;
+    prev_unit_imag = new sample[num_bins];
+    if(prev_unit_real2) delete [] prev_unit_real2;
+    prev_unit_real2 = new sample[num_bins];
+    if(prev_unit_imag2) delete [] prev_unit_imag2;
+    prev_unit_imag2 = new sample[num_bins];
+    for(int i = 0; i < num_bins; i++) {
+        prev_real[i] = 0.0;
+        prev_imag[i] = 0.0;
+        prev_unit_real[i] = 1.0;
+        prev_unit_imag[i] = 0.0;
+        prev_unit_real2[i] = 1.0;
+        prev_unit_imag2[i] = 0.0;
+    }
+
+    if(in) FFTW(free)(in);
+    in = (sample*) FFTW(malloc)(sizeof(sample) * frame_size);
 
-    if(out) fftw_free(out);
-	out = (fftw_complex*) fftw_malloc(sizeof(fftw_complex) * num_bins);
+    if(out) FFTW(free)(out);
+	out = (FFTW(complex)*) FFTW(malloc)(sizeof(FFTW(complex)) * num_bins);
 
-    fftw_destroy_plan(p);
-	p = fftw_plan_dft_r2c_1d(frame_size, in, out, FFTW_ESTIMATE);
+    destroy_fft_plan(p);
+    p = plan_fft(frame_size, in, out);
+
+    destroy_fft_batch(&fft_batch);
+    init_fft_batch(&fft_batch, frame_size, fft_batch_size);
+}
+
+OnsetDetectionFunction* ComplexODF::clone() {
+    ComplexODF* odf = new ComplexODF();
+    copy_parameters(odf);
+    return odf;
+}
+
+void ComplexODF::copy_parameters(OnsetDetectionFunction* odf) {
+    OnsetDetectionFunction::copy_parameters(odf);
+    ((ComplexODF*)odf)->set_phasor_prediction(phasor_prediction);
 }
 
 void ComplexODF::set_frame_size(int value) {
@@ -330,6 +1015,16 @@ void ComplexODF::set_frame_size(int value) {
     reset();
 }
 
+bool ComplexODF::get_phasor_prediction() {
+    return phasor_prediction;
+}
+
+// Changing the prediction mode resets the ODF state.
+void ComplexODF::set_phasor_prediction(bool value) {
+    phasor_prediction = value;
+    reset();
+}
+
 sample ComplexODF::process_frame(int signal_size, sample* signal) {
     if(signal_size != frame_size) {
         printf("Warning: size of signal passed to process_frame (%d) "
@@ -338,42 +1033,134 @@ sample ComplexODF::process_frame(int signal_size, sample* signal) {
         set_frame_size(signal_size);
     }
 
-    sample phase_prediction;
-    fftw_complex prediction;
-    sample sum = 0.0;
-
     // do a FFT of the current frame
     memcpy(in, &signal[0], sizeof(sample)*frame_size);
     window_frame(in);
-    fftw_execute(p);
+    FFTW(execute)(p);
 
-    // calculate sum of prediction errors
-    for(int bin = 0; bin < num_bins; bin++) {
-        // Magnitude prediction is just the previous magnitude.
-        // Phase prediction is the previous phase plus the difference between
-        // the previous two frames
+    return process_spectrum(out);
+}
+
+// Predict the current spectrum from the magnitudes and phases of the
+// previous frames, then save the magnitudes and phases of the current frame.
+void ComplexODF::predict_polar() {
+    sample phase_prediction;
+    sample* temp;
+    int bin;
+
+    // Phase prediction is the previous phase plus the difference between
+    // the previous two frames, brought into the range +- pi. The phases
+    // from 2 frames ago are not needed again, so the predictions replace them.
+    for(bin = 0; bin < num_bins; bin++) {
         phase_prediction = (2.0 * prev_phases[bin]) - prev_phases2[bin];
-        // bring it into the range +- pi
-        while(phase_prediction > M_PI) phase_prediction -= 2.0 * M_PI;
-        while(phase_prediction < M_PI) phase_prediction += 2.0 * M_PI;
-        // convert back into the complex domain to calculate stationarities
-        prediction[0] = prev_amps[bin] * cos(phase_prediction);
-        prediction[1] = prev_amps[bin] * sin(phase_prediction);
-        // get stationarity measures in the complex domain
-        sum += sqrt(
-            ((prediction[0] - out[bin][0]) * (prediction[0] - out[bin][0])) +
-            ((prediction[1] - out[bin][1]) * (prediction[1] - out[bin][1]))
-        );
+        prev_phases2[bin] = phase_prediction - (2.0 * M_PI *
+            floor((phase_prediction / (2.0 * M_PI)) + 0.5));
+    }
+
+    // Magnitude prediction is just the previous magnitude.
+    // Convert back into the complex domain to calculate stationarities
+    for(bin = 0; bin < num_bins; bin++) {
+        predicted_real[bin] = prev_amps[bin] * cos(prev_phases2[bin]);
+        predicted_imag[bin] = prev_amps[bin] * sin(prev_phases2[bin]);
+    }
+
+    // save the magnitudes and phases of the current frame. The previous
+    // phases become the phases from 2 frames ago, and the array of
+    // predictions is reused for the current phases.
+    for(bin = 0; bin < num_bins; bin++) {
         prev_amps[bin] = sqrt(
-            (out[bin][0] * out[bin][0]) + (out[bin][1] * out[bin][1])
+            (real[bin] * real[bin]) + (imag[bin] * imag[bin])
+        );
+    }
+    temp = prev_phases2;
+    prev_phases2 = prev_phases;
+    prev_phases = temp;
+    for(bin = 0; bin < num_bins; bin++) {
+        prev_phases[bin] = atan2(imag[bin], real[bin]);
+    }
+}
+
+// Make the same prediction as predict_polar without any trigonometric
+// functions. Rotating the previous value of a bin by the phase change
+// between the previous two frames gives the previous magnitude at the
+// predicted phase. The rotation is the product of the previous unit phasor
+// and the conjugate of the unit phasor from 2 frames ago.
+void ComplexODF::predict_phasor() {
+    sample rotation_real;
+    sample rotation_imag;
+    sample amp;
+    sample* temp;
+    int bin;
+
+    for(bin = 0; bin < num_bins; bin++) {
+        rotation_real = (prev_unit_real[bin] * prev_unit_real2[bin]) +
+                        (prev_unit_imag[bin] * prev_unit_imag2[bin]);
+        rotation_imag = (prev_unit_imag[bin] * prev_unit_real2[bin]) -
+                        (prev_unit_real[bin] * prev_unit_imag2[bin]);
+        predicted_real[bin] = (prev_real[bin] * rotation_real) -
+                              (prev_imag[bin] * rotation_imag);
+        predicted_imag[bin] = (prev_real[bin] * rotation_imag) +
+                              (prev_imag[bin] * rotation_real);
+    }
+
+    // save the current spectrum and its unit phasors. The unit phasors of a
+    // bin with no magnitude have the phase that atan2 would give it: pi if
+    // the real value is -0, otherwise 0.
+    temp = prev_unit_real2;
+    prev_unit_real2 = prev_unit_real;
+    prev_unit_real = temp;
+    temp = prev_unit_imag2;
+    prev_unit_imag2 = prev_unit_imag;
+    prev_unit_imag = temp;
+    for(bin = 0; bin < num_bins; bin++) {
+        amp = sqrt((real[bin] * real[bin]) + (imag[bin] * imag[bin]));
+        prev_unit_real[bin] = amp > 0 ? real[bin] / amp :
+                                        copysign((sample)1.0, real[bin]);
+        prev_unit_imag[bin] = amp > 0 ? imag[bin] / amp : 0.0;
+    }
+    memcpy(prev_real, real, sizeof(sample) * num_bins);
+    memcpy(prev_imag, imag, sizeof(sample) * num_bins);
+}
+
+sample ComplexODF::process_spectrum(FFTW(complex)* spectrum) {
+    sample sum = 0.0;
+    int bin;
+
+    // Each step is a separate loop over the bins, working on separate arrays
+    // of real and imaginary values, so that the compiler can vectorise them.
+    for(bin = 0; bin < num_bins; bin++) {
+        real[bin] = spectrum[bin][0];
+        imag[bin] = spectrum[bin][1];
+    }
+
+    if(phasor_prediction) {
+        predict_phasor();
+    }
+    else {
+        predict_polar();
+    }
+
+    // calculate sum of prediction errors in the complex domain
+    for(bin = 0; bin < num_bins; bin++) {
+        sum += sqrt(
+            ((predicted_real[bin] - real[bin]) *
+             (predicted_real[bin] - real[bin])) +
+            ((predicted_imag[bin] - imag[bin]) *
+             (predicted_imag[bin] - imag[bin]))
         );
-        prev_phases2[bin] = prev_phases[bin];
-        prev_phases[bin] = atan2(out[bin][1], out[bin][0]);
     }
 
     return sum;
 }
 
+// ----------------------------------------------------------------------------
+// Linear Prediction ODF
+
+void LinearPredictionODF::copy_parameters(OnsetDetectionFunction* odf) {
+    ((LinearPredictionODF*)odf)->set_order(order);
+    OnsetDetectionFunction::copy_parameters(odf);
+}
+
 // ----------------------------------------------------------------------------
 // LPEnergy
 
@@ -385,7 +1172,14 @@ LPEnergyODF::~LPEnergyODF() {
     destroy();
 }
 
+OnsetDetectionFunction* LPEnergyODF::clone() {
+    LPEnergyODF* odf = new LPEnergyODF();
+    copy_parameters(odf);
+    return odf;
+}
+
 void LPEnergyODF::init() {
+    init_burg_workspace(&burg_workspace, order, order);
     coefs = new sample[order];
     for(int i = 0; i < order; i++) {
         coefs[i] = 0;
@@ -398,6 +1192,7 @@ void LPEnergyODF::init() {
 }
 
 void LPEnergyODF::destroy() {
+    destroy_burg_workspace(&burg_workspace);
     if(coefs) delete [] coefs;
     if(prev_values) delete [] prev_values;
 }
@@ -420,7 +1215,7 @@ sample LPEnergyODF::process_frame(int signal_size, sample* signal) {
     }
 
     // get LP coefficients
-    burg(order, prev_values, order, order, coefs);
+    burg(order, prev_values, order, order, coefs, &burg_workspace);
     // get the difference between current and predicted energy values
     linear_prediction(order, prev_values, order, coefs, 1, &prediction);
     odf = fabs(energy - prediction);
@@ -440,7 +1235,7 @@ LPSpectralDifferenceODF::LPSpectralDifferenceODF() {
     prev_amps = NULL;
     in = NULL;
     out = NULL;
-	p = fftw_plan_dft_r2c_1d(frame_size, in, out, FFTW_ESTIMATE);
+    p = NULL;
     init();
 }
 
@@ -449,6 +1244,7 @@ LPSpectralDifferenceODF::~LPSpectralDifferenceODF() {
 }
 
 void LPSpectralDifferenceODF::init() {
+    init_burg_workspace(&burg_workspace, order, order);
     coefs = new sample[order];
     num_bins = (frame_size/2) + 1;
 
@@ -459,37 +1255,44 @@ void LPSpectralDifferenceODF::init() {
     }
     hann_window(frame_size, window);
 
-    prev_amps = new sample*[num_bins];
-    for(int i = 0; i < num_bins; i++) {
-        prev_amps[i] = new sample[order];
-        for(int j = 0; j < order; j++) {
-            prev_amps[i][j] = 0.0;
-        }
+    // The previous amplitudes of each bin are kept in consecutive blocks of
+    // 2 * order values. Each amplitude is written to positions history_head
+    // and history_head + order of its block, so the last order amplitudes
+    // are always stored in order (oldest first) starting at history_head.
+    prev_amps = new sample[num_bins * 2 * order];
+    for(int i = 0; i < num_bins * 2 * order; i++) {
+        prev_amps[i] = 0.0;
     }
+    history_head = 0;
 
-    in = (sample*) fftw_malloc(sizeof(sample) * frame_size);
-	out = (fftw_complex*) fftw_malloc(sizeof(fftw_complex) * num_bins);
-	p = fftw_plan_dft_r2c_1d(frame_size, in, out, FFTW_ESTIMATE);
+    in = (sample*) FFTW(malloc)(sizeof(sample) * frame_size);
+	out = (FFTW(complex)*) FFTW(malloc)(sizeof(FFTW(complex)) * num_bins);
+    p = plan_fft(frame_size, in, out);
+    init_fft_batch(&fft_batch, frame_size, fft_batch_size);
 }
 
 void LPSpectralDifferenceODF::destroy() {
+    destroy_burg_workspace(&burg_workspace);
     if(window) delete [] window;
     if(coefs) delete [] coefs;
-    if(prev_amps) {
-        for(int i = 0; i < num_bins; i++) {
-            if(prev_amps[i]) delete [] prev_amps[i];
-        }
-        delete [] prev_amps;
-    }
-    if(in) fftw_free(in);
-    if(out) fftw_free(out);
-    fftw_destroy_plan(p);
+    if(prev_amps) delete [] prev_amps;
+    if(in) FFTW(free)(in);
+    if(out) FFTW(free)(out);
+    destroy_fft_plan(p);
+    destroy_fft_batch(&fft_batch);
 
     window = NULL;
     coefs = NULL;
     prev_amps = NULL;
     in = NULL;
     out = NULL;
+    p = NULL;
+}
+
+OnsetDetectionFunction* LPSpectralDifferenceODF::clone() {
+    LPSpectralDifferenceODF* odf = new LPSpectralDifferenceODF();
+    copy_parameters(odf);
+    return odf;
 }
 
 void LPSpectralDifferenceODF::set_frame_size(int value) {
@@ -507,29 +1310,35 @@ sample LPSpectralDifferenceODF::process_frame(int signal_size,
         set_frame_size(signal_size);
     }
 
-    sample sum = 0.0;
-    sample amp = 0.0;
-    sample prediction = 0.0;
-
     // do a FFT of the current frame
     memcpy(in, &signal[0], sizeof(sample)*frame_size);
     window_frame(in);
-    fftw_execute(p);
+    FFTW(execute)(p);
+
+    return process_spectrum(out);
+}
+
+sample LPSpectralDifferenceODF::process_spectrum(FFTW(complex)* spectrum) {
+    sample sum = 0.0;
+    sample amp = 0.0;
+    sample prediction = 0.0;
+    sample* history;
 
     // calculate the amplitude differences between bins from consecutive frames
     for(int bin = 0; bin < num_bins; bin++) {
-        amp = sqrt((out[bin][0]*out[bin][0]) + (out[bin][1]*out[bin][1]));
+        amp = sqrt((spectrum[bin][0]*spectrum[bin][0]) +
+                   (spectrum[bin][1]*spectrum[bin][1]));
+        history = &prev_amps[(bin * 2 * order) + history_head];
         // get LP coefficients
-        burg(order, prev_amps[bin], order, order, coefs);
+        burg(order, history, order, order, coefs, &burg_workspace);
         // get the difference between current and predicted values
-        linear_prediction(order, prev_amps[bin], order, coefs, 1, &prediction);
+        linear_prediction(order, history, order, coefs, 1, &prediction);
         sum += fabs(amp - prediction);
-        // move frames back by 1
-        for(int j = 0; j < order-1; j++) {
-            prev_amps[bin][j] = prev_amps[bin][j+1];
-        }
-        prev_amps[bin][order-1] = amp;
+        // replace the oldest amplitude
+        history[0] = amp;
+        history[order] = amp;
     }
+    history_head = (history_head + 1) % order;
 
     return sum;
 }
@@ -540,9 +1349,10 @@ sample LPSpectralDifferenceODF::process_frame(int signal_size,
 LPComplexODF::LPComplexODF() {
     prev_frame = NULL;
     distances = NULL;
+    frame_distances = NULL;
     in = NULL;
     out = NULL;
-	p = fftw_plan_dft_r2c_1d(frame_size, in, out, FFTW_ESTIMATE);
+    p = NULL;
     init();
 }
 
@@ -551,6 +1361,7 @@ LPComplexODF::~LPComplexODF() {
 }
 
 void LPComplexODF::init() {
+    init_burg_workspace(&burg_workspace, order, order);
     coefs = new sample[order];
     num_bins = (frame_size / 2) + 1;
 
@@ -561,45 +1372,54 @@ void LPComplexODF::init() {
     }
     hann_window(frame_size, window);
 
-    distances = new sample*[num_bins];
-    for(int i = 0; i < num_bins; i++) {
-        distances[i] = new sample[order];
-        for(int j = 0; j < order; j++) {
-            distances[i][j] = 0.0;
-        }
+    // distances are stored in the same way as the amplitudes in
+    // LPSpectralDifferenceODF, in blocks of 2 * order values per bin
+    distances = new sample[num_bins * 2 * order];
+    for(int i = 0; i < num_bins * 2 * order; i++) {
+        distances[i] = 0.0;
     }
+    history_head = 0;
+
+    frame_distances = new sample[num_bins];
 
-    prev_frame = new fftw_complex[num_bins];
+    prev_frame = new FFTW(complex)[num_bins];
     for(int i = 0; i < num_bins; i++) {
         prev_frame[i][0] = 0.0;
         prev_frame[i][1] = 0.0;
     }
 
-    in = (sample*) fftw_malloc(sizeof(sample) * frame_size);
-	out = (fftw_complex*) fftw_malloc(sizeof(fftw_complex) * num_bins);
-	p = fftw_plan_dft_r2c_1d(frame_size, in, out, FFTW_ESTIMATE);
+    in = (sample*) FFTW(malloc)(sizeof(sample) * frame_size);
+	out = (FFTW(complex)*) FFTW(malloc)(sizeof(FFTW(complex)) * num_bins);
+    p = plan_fft(frame_size, in, out);
+    init_fft_batch(&fft_batch, frame_size, fft_batch_size);
 }
 
 void LPComplexODF::destroy() {
+    destroy_burg_workspace(&burg_workspace);
     if(window) delete [] window;
     if(coefs) delete [] coefs;
-    if(distances) {
-        for(int i = 0; i < num_bins; i++) {
-            if(distances[i]) delete [] distances[i];
-        }
-        delete [] distances;
-    }
+    if(distances) delete [] distances;
+    if(frame_distances) delete [] frame_distances;
     if(prev_frame) delete [] prev_frame;
-    if(in) fftw_free(in);
-    if(out) fftw_free(out);
-    fftw_destroy_plan(p);
+    if(in) FFTW(free)(in);
+    if(out) FFTW(free)(out);
+    destroy_fft_plan(p);
+    destroy_fft_batch(&fft_batch);
 
     window = NULL;
     coefs = NULL;
     distances = NULL;
+    frame_distances = NULL;
     prev_frame = NULL;
     in = NULL;
     out = NULL;
+    p = NULL;
+}
+
+OnsetDetectionFunction* LPComplexODF::clone() {
+    LPComplexODF* odf = new LPComplexODF();
+    copy_parameters(odf);
+    return odf;
 }
 
 void LPComplexODF::set_frame_size(int value) {
@@ -616,38 +1436,47 @@ sample LPComplexODF::process_frame(int signal_size, sample* signal) {
         set_frame_size(signal_size);
     }
 
-    sample sum = 0.0;
-    sample amp = 0.0;
-    sample prediction = 0.0;
-    sample distance = 0.0;
-
     // do a FFT of the current frame
     memcpy(in, &signal[0], sizeof(sample)*frame_size);
     window_frame(in);
-    fftw_execute(p);
+    FFTW(execute)(p);
 
-    for(int bin = 0; bin < num_bins; bin++) {
-        distance = sqrt(
-            (out[bin][0]-prev_frame[bin][0])*(out[bin][0]-prev_frame[bin][0]) +
-            (out[bin][1]-prev_frame[bin][1])*(out[bin][1]-prev_frame[bin][1])
+    return process_spectrum(out);
+}
+
+sample LPComplexODF::process_spectrum(FFTW(complex)* spectrum) {
+    sample sum = 0.0;
+    sample prediction = 0.0;
+    sample distance = 0.0;
+    sample* history;
+    int bin;
+
+    // calculate complex distances in a separate loop, so that the compiler
+    // can vectorise it
+    for(bin = 0; bin < num_bins; bin++) {
+        frame_distances[bin] = sqrt(
+            (spectrum[bin][0] - prev_frame[bin][0]) *
+            (spectrum[bin][0] - prev_frame[bin][0]) +
+            (spectrum[bin][1] - prev_frame[bin][1]) *
+            (spectrum[bin][1] - prev_frame[bin][1])
         );
+    }
+    memcpy(prev_frame, spectrum, sizeof(FFTW(complex)) * num_bins);
 
+    for(bin = 0; bin < num_bins; bin++) {
+        distance = frame_distances[bin];
+        history = &distances[(bin * 2 * order) + history_head];
         // get LP coefficients
-        burg(order, distances[bin], order, order, coefs);
+        burg(order, history, order, order, coefs, &burg_workspace);
         // get the difference between current and predicted values
-        linear_prediction(order, distances[bin], order, coefs, 1, &prediction);
+        linear_prediction(order, history, order, coefs, 1, &prediction);
         sum += fabs(distance - prediction);
 
-        // update distances
-        for(int j = 0; j < order-1; j++) {
-            distances[bin][j] = distances[bin][j+1];
-        }
-        distances[bin][order-1] = distance;
-
-        // update previous frame
-        prev_frame[bin][0] = out[bin][0];
-        prev_frame[bin][1] = out[bin][1];
+        // replace the oldest distance
+        history[0] = distance;
+        history[order] = distance;
     }
+    history_head = (history_head + 1) % order;
 
     return sum;
 }
@@ -671,6 +1500,17 @@ PeakODF::~PeakODF() {
     free(mq_params);
 }
 
+OnsetDetectionFunction* PeakODF::clone() {
+    PeakODF* odf = new PeakODF();
+    copy_parameters(odf);
+    return odf;
+}
+
+void PeakODF::copy_parameters(OnsetDetectionFunction* odf) {
+    OnsetDetectionFunction::copy_parameters(odf);
+    ((PeakODF*)odf)->set_max_peaks(get_max_peaks());
+}
+
 void PeakODF::reinit() {
     reset_mq(mq_params);
     destroy_mq(mq_params);
@@ -722,6 +1562,12 @@ sample PeakODF::process_frame(int signal_size, sample* signal) {
     return sum;
 }
 
+OnsetDetectionFunction* UnmatchedPeaksODF::clone() {
+    UnmatchedPeaksODF* odf = new UnmatchedPeaksODF();
+    copy_parameters(odf);
+    return odf;
+}
+
 sample UnmatchedPeaksODF::get_distance(Peak* peak1, Peak* peak2) {
     if(peak1 && !peak2) {
         return peak1->amplitude;
@@ -729,6 +1575,12 @@ sample UnmatchedPeaksODF::get_distance(Peak* peak1, Peak* peak2) {
     return 0.0;
 }
 
+OnsetDetectionFunction* PeakAmpDifferenceODF::clone() {
+    PeakAmpDifferenceODF* odf = new PeakAmpDifferenceODF();
+    copy_parameters(odf);
+    return odf;
+}
+
 sample PeakAmpDifferenceODF::get_distance(Peak* peak1, Peak* peak2) {
     if(peak1 && !peak2) {
         return peak1->amplitude;
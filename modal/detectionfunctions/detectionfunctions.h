@@ -4,17 +4,82 @@
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
-#include <fftw3.h>
 #include <math.h>
+#include "precision.h"
 #include "mq.h"
 #include "exceptions.h"
 
-typedef double sample;
-
 void hann_window(int window_size, sample* window);
 
+// FFT planning
+//
+// The C++ ODFs plan their FFTs using the current planning flag. FFT_ESTIMATE
+// (the default) plans quickly, while FFT_MEASURE, FFT_PATIENT and
+// FFT_EXHAUSTIVE take progressively longer to plan but usually find faster
+// FFTs. Planning flags only affect ODFs created or resized after they are set.
+//
+// If a wisdom file is set, existing FFTW wisdom is imported from it, and the
+// file is updated whenever an FFT that is not already in the wisdom is
+// planned with anything other than FFT_ESTIMATE. Slow plans then only need
+// to be measured once per machine.
+// The file is replaced by renaming a new file over it, so other processes
+// never read a partly written file. Wisdom is specific to the sample
+// precision, so double and single precision builds should use different
+// files.
+enum {
+    FFT_ESTIMATE = FFTW_ESTIMATE,
+    FFT_MEASURE = FFTW_MEASURE,
+    FFT_PATIENT = FFTW_PATIENT,
+    FFT_EXHAUSTIVE = FFTW_EXHAUSTIVE
+};
+int get_fft_planning_flag();
+void set_fft_planning_flag(int flag);
+const char* get_fft_wisdom_file();
+void set_fft_wisdom_file(const char* file_name);
+bool import_fft_wisdom(const char* file_name);
+bool export_fft_wisdom(const char* file_name);
+FFTW(plan) plan_fft(int frame_size, sample* in, FFTW(complex)* out);
+FFTW(plan) plan_fft_batch(int frame_size, int num_frames,
+                          sample* in, FFTW(complex)* out);
+void destroy_fft_plan(FFTW(plan) p);
+
+// A batch of up to max_frames frames that are windowed into one buffer and
+// transformed together with a single FFTW plan. The spectrum of frame i
+// starts at out[i * num_bins].
+typedef struct FFTBatch {
+    int frame_size;
+    int num_bins;
+    int max_frames;
+    sample* in;
+    FFTW(complex)* out;
+    FFTW(plan) p;
+} FFTBatch;
+
+int init_fft_batch(FFTBatch* batch, int frame_size, int max_frames);
+int destroy_fft_batch(FFTBatch* batch);
+int fft_frames(FFTBatch* batch, int signal_size, sample* signal,
+               int start, int hop_size, int count, sample* window);
+
+// Scratch memory for burg(). A workspace can be used to calculate up to
+// max_coefs coefficients for signals of up to max_signal_size samples, and
+// burg() does not allocate any memory when it is given a workspace.
+typedef struct BurgWorkspace {
+    int max_signal_size;
+    int max_coefs;
+    sample* f;
+    sample* b;
+    sample* temp_coefs;
+    sample* reversed_coefs;
+} BurgWorkspace;
+
+int init_burg_workspace(BurgWorkspace* workspace, int max_signal_size,
+                        int max_coefs);
+int destroy_burg_workspace(BurgWorkspace* workspace);
+
 void burg(int signal_size, sample* signal, int order,
 		  int num_coefs, sample* coefs);
+void burg(int signal_size, sample* signal, int order,
+		  int num_coefs, sample* coefs, BurgWorkspace* workspace);
 void linear_prediction(int signal_size, sample* signal,
 					   int num_coefs, sample* coefs,
 					   int num_predictions, sample* predictions);
@@ -24,14 +89,42 @@ class OnsetDetectionFunction {
         int sampling_rate;
         int frame_size;
         int hop_size;
+        int num_threads;
         sample* window;
+        // ODFs that calculate their values from the spectrum of each frame
+        // initialise fft_batch and implement process_spectrum, so that
+        // process_frames can transform several frames at a time
+        FFTBatch fft_batch;
+        virtual sample process_spectrum(FFTW(complex)* spectrum) {
+            return 0.0;
+        }
+        virtual void copy_parameters(OnsetDetectionFunction* odf);
+        int process_frames_threaded(int signal_size, sample* signal,
+                                    int num_frames, sample* odf);
 
     public:
         OnsetDetectionFunction() {
             sampling_rate = 44100;
             frame_size = 512;
             hop_size = 256;
+            num_threads = 1;
             window = NULL;
+            fft_batch.max_frames = 0;
+            fft_batch.in = NULL;
+            fft_batch.out = NULL;
+            fft_batch.p = NULL;
+        }
+        virtual ~OnsetDetectionFunction() {
+            destroy_fft_batch(&fft_batch);
+        }
+
+        // Return a new ODF of the same type and with the same parameters,
+        // but without any state from previously processed frames.
+        virtual OnsetDetectionFunction* clone();
+
+        // The number of previous frames that the value of a frame depends on.
+        virtual int get_history_size() {
+            return 0;
         }
 
         virtual void window_frame(sample* frame) {
@@ -48,22 +141,48 @@ class OnsetDetectionFunction {
         virtual void set_sampling_rate(int value);
         virtual void set_frame_size(int value);
         virtual void set_hop_size(int value);
+        virtual int get_num_threads();
+        virtual void set_num_threads(int value);
 
         virtual sample process_frame(int signal_size, sample* signal) {
             return 0.0;
         }
-        void process(int signal_size, sample* signal,
-                     int odf_size, sample* odf);
+        virtual int process_frames(int signal_size, sample* signal,
+                                   int start, int count,
+                                   int odf_size, sample* odf);
+        virtual void process(int signal_size, sample* signal,
+                             int odf_size, sample* odf);
 };
 
 class EnergyODF : public OnsetDetectionFunction {
     protected:
         sample prev_energy;
+        // If true, process_frame assumes that each frame starts hop_size
+        // samples after the previous one, and only squares the new samples.
+        bool consecutive_frames;
+        int chunk_size;
+        int num_chunks;
+        int chunk_index;
+        bool use_chunks;
+        bool have_chunk_energies;
+        sample* chunk_energies;
+        void reset_chunks();
+        sample frame_energy(sample* frame);
 
     public:
-        EnergyODF() {
-            prev_energy = 0.0;
+        EnergyODF();
+        ~EnergyODF();
+        OnsetDetectionFunction* clone();
+        int get_history_size() {
+            return 1;
         }
+        virtual void set_frame_size(int value);
+        virtual void set_hop_size(int value);
+        bool get_consecutive_frames();
+        void set_consecutive_frames(bool value);
+        int process_frames(int signal_size, sample* signal,
+                           int start, int count,
+                           int odf_size, sample* odf);
         sample process_frame(int signal_size, sample* signal);
 };
 
@@ -72,12 +191,17 @@ class SpectralDifferenceODF : public OnsetDetectionFunction {
         int num_bins;
         sample* prev_amps;
         sample* in;
-        fftw_complex* out;
-        fftw_plan p;
+        FFTW(complex)* out;
+        FFTW(plan) p;
+        sample process_spectrum(FFTW(complex)* spectrum);
 
     public:
         SpectralDifferenceODF();
         ~SpectralDifferenceODF();
+        OnsetDetectionFunction* clone();
+        int get_history_size() {
+            return 1;
+        }
         void reset();
         virtual void set_frame_size(int value);
         sample process_frame(int signal_size, sample* signal);
@@ -89,15 +213,43 @@ class ComplexODF : public OnsetDetectionFunction {
         sample* prev_amps;
         sample* prev_phases;
         sample* prev_phases2;  // 2 frames ago
+        // current spectrum and predictions, stored as separate arrays of
+        // real and imaginary values
+        sample* real;
+        sample* imag;
+        sample* predicted_real;
+        sample* predicted_imag;
+        // If true, each prediction is made by rotating the previous value of
+        // the bin by the phase change between the previous two frames, using
+        // unit phasors instead of sin, cos and atan2. The phasor arrays hold
+        // the previous spectrum and the unit phasors of the previous two
+        // frames.
+        bool phasor_prediction;
+        sample* prev_real;
+        sample* prev_imag;
+        sample* prev_unit_real;
+        sample* prev_unit_imag;
+        sample* prev_unit_real2;
+        sample* prev_unit_imag2;
         sample* in;
-        fftw_complex* out;
-        fftw_plan p;
+        FFTW(complex)* out;
+        FFTW(plan) p;
+        virtual void copy_parameters(OnsetDetectionFunction* odf);
+        void predict_polar();
+        void predict_phasor();
+        sample process_spectrum(FFTW(complex)* spectrum);
 
     public:
         ComplexODF();
         ~ComplexODF();
+        OnsetDetectionFunction* clone();
+        int get_history_size() {
+            return 2;
+        }
         void reset();
         virtual void set_frame_size(int value);
+        bool get_phasor_prediction();
+        void set_phasor_prediction(bool value);
         sample process_frame(int signal_size, sample* signal);
 };
 
@@ -105,6 +257,8 @@ class LinearPredictionODF : public OnsetDetectionFunction {
     protected:
         int order;
         sample* coefs;
+        BurgWorkspace burg_workspace;
+        virtual void copy_parameters(OnsetDetectionFunction* odf);
 
     public:
         LinearPredictionODF() {
@@ -129,6 +283,10 @@ class LPEnergyODF : public LinearPredictionODF {
     public:
         LPEnergyODF();
         ~LPEnergyODF();
+        OnsetDetectionFunction* clone();
+        int get_history_size() {
+            return order;
+        }
         void init();
         void destroy();
         sample process_frame(int signal_size, sample* signal);
@@ -137,14 +295,20 @@ class LPEnergyODF : public LinearPredictionODF {
 class LPSpectralDifferenceODF : public LinearPredictionODF {
     protected:
         int num_bins;
-        sample** prev_amps;
+        sample* prev_amps;  // num_bins blocks of 2 * order values
+        int history_head;
         sample* in;
-        fftw_complex* out;
-        fftw_plan p;
+        FFTW(complex)* out;
+        FFTW(plan) p;
+        sample process_spectrum(FFTW(complex)* spectrum);
 
     public:
         LPSpectralDifferenceODF();
         ~LPSpectralDifferenceODF();
+        OnsetDetectionFunction* clone();
+        int get_history_size() {
+            return order;
+        }
         void init();
         void destroy();
         virtual void set_frame_size(int value);
@@ -154,15 +318,22 @@ class LPSpectralDifferenceODF : public LinearPredictionODF {
 class LPComplexODF : public LinearPredictionODF {
     protected:
         int num_bins;
-        fftw_complex* prev_frame;
-        sample** distances;
+        FFTW(complex)* prev_frame;
+        sample* distances;  // num_bins blocks of 2 * order values
+        sample* frame_distances;
+        int history_head;
         sample* in;
-        fftw_complex* out;
-        fftw_plan p;
+        FFTW(complex)* out;
+        FFTW(plan) p;
+        sample process_spectrum(FFTW(complex)* spectrum);
 
     public:
         LPComplexODF();
         ~LPComplexODF();
+        OnsetDetectionFunction* clone();
+        int get_history_size() {
+            return order + 1;
+        }
         void init();
         void destroy();
         virtual void set_frame_size(int value);
@@ -175,10 +346,15 @@ struct Peak;
 class PeakODF : public OnsetDetectionFunction {
     protected:
         MQParameters* mq_params;
+        virtual void copy_parameters(OnsetDetectionFunction* odf);
 
     public:
         PeakODF();
         virtual ~PeakODF();
+        virtual OnsetDetectionFunction* clone();
+        int get_history_size() {
+            return 1;
+        }
         virtual void reinit();
         virtual void reset();
         virtual void set_frame_size(int value);
@@ -193,11 +369,13 @@ class PeakODF : public OnsetDetectionFunction {
 
 class UnmatchedPeaksODF : public PeakODF {
     public:
+        OnsetDetectionFunction* clone();
         sample get_distance(Peak* peak1, Peak* peak2);
 };
 
 class PeakAmpDifferenceODF : public PeakODF {
     public:
+        OnsetDetectionFunction* clone();
         sample get_distance(Peak* peak1, Peak* peak2);
         sample max_odf_value();
 };
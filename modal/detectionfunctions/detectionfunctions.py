@@ -1,7 +1,9 @@
+from fractions import gcd
 import numpy as np
 import scipy.signal
 import mq
 import lp
+import fft
 
 # -----------------------------------------------------------------------------
 # Spectral processing
@@ -16,58 +18,99 @@ def toRectangular(mag, phase):
                       mag * np.sin(phase))
 
 
+# -----------------------------------------------------------------------------
+# Framing
+
+
+def frames(signal, frame_size, hop_size):
+    '''Return a read-only 2D view of signal with one frame per row.
+    Frames start every hop_size samples, and only frames that fit completely
+    inside the signal are included. No samples are copied.'''
+    signal = np.asarray(signal)
+    num_frames = ((len(signal) - frame_size) / hop_size) + 1
+    if num_frames < 1:
+        return np.zeros((0, frame_size), dtype=signal.dtype)
+    stride = signal.strides[0]
+    return np.lib.stride_tricks.as_strided(
+        signal, shape=(num_frames, frame_size),
+        strides=(hop_size * stride, stride), writeable=False
+    )
+
+
+def spectra(signal, window, hop_size):
+    '''Return the spectrum of every complete frame in signal, one per row.
+    The frame size is the size of window, which is applied to each frame.'''
+    return fft.rfft(frames(signal, len(window), hop_size) * window)
+
+
+# -----------------------------------------------------------------------------
+# History
+
+
+class HistoryBuffer(object):
+    '''Fixed-length history of the most recent values, oldest first.
+    Each value is written to two positions in a circular buffer, so the full
+    history is always available as a contiguous view and appending a value
+    never allocates or moves any memory.'''
+    def __init__(self, length, shape=(), dtype=np.double):
+        self.length = length
+        self._values = np.zeros((2 * length,) + shape, dtype=dtype)
+        self._head = 0
+
+    def values(self):
+        return self._values[self._head:self._head + self.length]
+
+    def append(self, value):
+        self._values[self._head] = value
+        self._values[self._head + self.length] = value
+        self._head = (self._head + 1) % self.length
+
+
 # -----------------------------------------------------------------------------
 # Low-pass filter
 
 
 def lpf(signal, order, cutoff):
-    'Low-pass FIR filter'
+    '''Low-pass FIR filter. Returns len(signal) samples, centred in the
+    same way as np.convolve(signal, filter, 'same'), even if the signal is
+    shorter than the filter.'''
     filter = scipy.signal.firwin(order, cutoff)
-    return np.convolve(signal, filter, 'same')
+    start = (len(filter) - 1) / 2
+    return np.convolve(signal, filter)[start:start + len(signal)]
 
 
 # -----------------------------------------------------------------------------
 # Moving average
 
 
+def moving_average_coefs(num_points):
+    '''Return the filter coefficients of a num_points moving average.
+    If num_points is even, it is increased by 1.'''
+    # make sure num_points is odd
+    if num_points % 2 == 0:
+        num_points += 1
+    return np.ones(num_points) / num_points
+
+
 def moving_average(signal, num_points):
     '''Smooth signal by returning a num_points moving average.
     The first and last num_points/2 are zeros.
     See: http://en.wikipedia.org/wiki/Moving_average'''
-    ma = np.zeros(signal.size)
-    # make sure num_points is odd
-    if num_points % 2 == 0:
-        num_points += 1
-    n = int(num_points / 2)
-    centre = n
-    # for each num_points window in the signal, calculate the average
-    while centre < signal.size - n:
-        avg = 0.0
-        for i in np.arange(centre - n, centre + n + 1):
-            avg += signal[i]
-        avg /= num_points
-        ma[centre] = avg
-        centre += 1
-    return ma
+    return _centred_filter(signal, moving_average_coefs(num_points))
 
 
 # -----------------------------------------------------------------------------
 # Savitzky-Golay
 
 
-def savitzky_golay(signal, num_points):
-    '''Smooth a signal using the Savitzky-Golay algorithm.
-    The first and last num_points/2 are zeros.
-    See: http://www.statistics4u.com/fundstat_eng/cc_filter_savgolay.html'''
-    sg = np.zeros(signal.size)
-
+def savitzky_golay_coefs(num_points):
+    '''Return the normalised Savitzky-Golay filter coefficients for
+    num_points, which must be 5, 7, 9 or 11.'''
     # make sure num_points is valid. If not, use defaults
     if not num_points in [5, 7, 9, 11]:
         print 'Invalid number of points to Savitzky-Golay algorithm, ',
         print 'using default (5).'
         num_points = 5
-    n = int(num_points / 2)
-    centre = n
 
     # set up savitzky golay coefficients
     if num_points == 5:
@@ -79,21 +122,45 @@ def savitzky_golay(signal, num_points):
     elif num_points == 11:
         coefs = np.array([-36, 9, 44, 69, 84, 89, 84, 69, 44, 9, -36])
 
-    # calculate denominator
-    denom = np.sum(coefs)
+    # divide by the denominator
+    return coefs / float(np.sum(coefs))
 
-    # for each num_points window in the signal, calculate the average
-    while centre < signal.size - n:
-        avg = 0.0
-        c = 0
-        for i in np.arange(centre - n, centre + n + 1):
-            # calculate weighted average
-            avg += signal[i] * coefs[c]
-            c += 1
-        avg /= denom
-        sg[centre] = avg
-        centre += 1
-    return sg
+
+def savitzky_golay(signal, num_points):
+    '''Smooth a signal using the Savitzky-Golay algorithm.
+    The first and last num_points/2 are zeros.
+    See: http://www.statistics4u.com/fundstat_eng/cc_filter_savgolay.html'''
+    return _centred_filter(signal, savitzky_golay_coefs(num_points))
+
+
+def _centred_filter(signal, coefs):
+    '''Filter signal with the (odd length) coefs, centring each window on
+    the output sample. The first and last len(coefs)/2 are zeros.'''
+    result = np.zeros(signal.size)
+    n = len(coefs) / 2
+    if signal.size >= len(coefs):
+        result[n:signal.size - n] = np.convolve(signal, coefs[::-1], 'valid')
+    return result
+
+
+# -----------------------------------------------------------------------------
+# Streaming smoothing
+
+
+class Smoother(object):
+    '''Causal, stateful FIR smoothing for ODF values that are calculated one
+    frame at a time (using process_frame).
+    Each call to smooth adds the next ODF value and returns the smoothed
+    value for the frame len(coefs)/2 (self.delay) frames earlier. Until
+    len(coefs) values have been added, missing values are treated as zeros.'''
+    def __init__(self, coefs):
+        self.coefs = np.array(coefs[::-1], dtype=np.double)
+        self.delay = len(coefs) / 2
+        self._history = HistoryBuffer(len(coefs))
+
+    def smooth(self, value):
+        self._history.append(value)
+        return np.dot(self._history.values(), self.coefs)
 
 
 # -----------------------------------------------------------------------------
@@ -124,6 +191,10 @@ class OnsetDetectionFunction(object):
         self.smooth_window = 5
         self.lpf_cutoff = 0.15
         self.lpf_order = 101
+        # maximum number of frames that process() analyses in one step
+        self.block_size = 256
+        # sample type, np.double or np.float32
+        self._dtype = np.dtype(np.double)
 
     sampling_rate = property(lambda self: self.get_sampling_rate(),
                              lambda self, x: self.set_sampling_rate(x))
@@ -134,6 +205,9 @@ class OnsetDetectionFunction(object):
     hop_size = property(lambda self: self.get_hop_size(),
                         lambda self, x: self.set_hop_size(x))
 
+    dtype = property(lambda self: self.get_dtype(),
+                     lambda self, x: self.set_dtype(x))
+
     def get_sampling_rate(self):
         return self._sampling_rate
 
@@ -152,19 +226,77 @@ class OnsetDetectionFunction(object):
     def set_hop_size(self, hop_size):
         self._hop_size = hop_size
 
+    def get_dtype(self):
+        return self._dtype
+
+    def set_dtype(self, dtype):
+        '''Set the type of the samples that will be analysed (np.double or
+        np.float32). Windows, spectra and the ODF state use the same type, so
+        single precision signals are analysed in single precision.'''
+        self._dtype = np.dtype(dtype)
+        # reallocate the window and state arrays
+        self.set_frame_size(self.frame_size)
+
     def _smooth(self, signal):
         if self.smooth_type == self.SMOOTH_MOVING_AVERAGE:
             return moving_average(signal, self.smooth_window)
         elif self.smooth_type == self.SMOOTH_SAVITZKY_GOLAY:
             return savitzky_golay(signal, self.smooth_window)
         elif self.smooth_type == self.SMOOTH_LPF:
-            return filter.lpf(signal, self.lpf_order, self.lpf_cutoff)
+            return lpf(signal, self.lpf_order, self.lpf_cutoff)
         # default action is not to smooth
         return signal
 
+    def smoother(self):
+        '''Return a new Smoother that applies the current smoothing settings
+        to ODF values as they are returned by process_frame.'''
+        if self.smooth_type == self.SMOOTH_MOVING_AVERAGE:
+            return Smoother(moving_average_coefs(self.smooth_window))
+        elif self.smooth_type == self.SMOOTH_SAVITZKY_GOLAY:
+            return Smoother(savitzky_golay_coefs(self.smooth_window))
+        elif self.smooth_type == self.SMOOTH_LPF:
+            return Smoother(scipy.signal.firwin(self.lpf_order,
+                                                self.lpf_cutoff))
+        # default action is not to smooth
+        return Smoother(np.ones(1))
+
     def process_frame(self, frame):
         return 0.0
 
+    def _process_block(self, signal):
+        '''Return an array containing the ODF value of every complete frame
+        in signal. Subclasses can override this to analyse a block of frames
+        at once, but must update their state exactly as process_frame would.'''
+        return np.array([self.process_frame(frame) for frame in
+                         frames(signal, self.frame_size, self.hop_size)])
+
+    def process_frames(self, signal, start, count, detection_function):
+        '''
+        Calculate the ODF values of up to count consecutive frames, the first
+        starting at signal[start] and each following frame starting hop_size
+        samples later. The values are written to detection_function without
+        being normalised, and the ODF state is updated just as if
+        process_frame was called for each frame.
+        Returns the number of frames processed, which is less than count if
+        the end of the signal is reached first.
+        '''
+        if start < 0:
+            raise Exception('Start position must not be negative')
+        if len(detection_function) < count:
+            msg = 'detection function not large enough: %d (need %d)' % \
+                (len(detection_function), count)
+            raise Exception(msg)
+
+        num_frames = max(0, (len(signal) - start - self.frame_size) /
+                         self.hop_size + 1)
+        num_frames = min(count, num_frames)
+        if not num_frames:
+            return 0
+        end = start + ((num_frames - 1) * self.hop_size) + self.frame_size
+        for i, n, block in self._blocks(signal[start:end]):
+            detection_function[i:i + n] = self._process_block(block)
+        return num_frames
+
     def process(self, signal, detection_function):
         # give a warning if the hop size does not divide evenly into the
         # signal size
@@ -175,30 +307,41 @@ class OnsetDetectionFunction(object):
         # make sure the given detection function array is large enough
         if len(detection_function) < len(signal) / self.hop_size:
             msg = 'detection function not large enough: %d (need %d)' % \
-                len(detection_function), len(signal) / self.hop_size
+                (len(detection_function), len(signal) / self.hop_size)
             raise Exception(msg)
 
         # get a list of values for each frame
-        sample_offset = 0
-        i = 0
-        while sample_offset + self.frame_size <= len(signal):
-            frame = signal[sample_offset:sample_offset + self.frame_size]
-            detection_function[i] = self.process_frame(frame)
-            sample_offset += self.hop_size
-            i += 1
-
-        # perform any post-processing on the ODF
+        for i, n, block in self._blocks(signal):
+            detection_function[i:i + n] = self._process_block(block)
+
+        self._post_process(detection_function)
+        return self.det_func
+
+    def _blocks(self, signal):
+        '''Split signal into blocks of up to self.block_size frames.
+        Yields the index of the first frame in each block, the number of
+        frames and the block of samples.'''
+        num_frames = ((len(signal) - self.frame_size) / self.hop_size) + 1
+        for i in range(0, num_frames, self.block_size):
+            n = min(self.block_size, num_frames - i)
+            start = i * self.hop_size
+            end = start + ((n - 1) * self.hop_size) + self.frame_size
+            yield i, n, signal[start:end]
+
+    def _post_process(self, detection_function):
+        '''Smooth and normalise detection_function in place.'''
+        if self.smooth_type != self.SMOOTH_NONE:
+            detection_function[:] = self._smooth(detection_function)
         normalise(detection_function)
         self.det_func = detection_function
-        return self.det_func
 
     def smooth_type_string(self):
         if self.smooth_type == self.SMOOTH_MOVING_AVERAGE:
-            'moving_average'
+            return 'moving_average'
         elif self.smooth_type == self.SMOOTH_SAVITZKY_GOLAY:
-            'savitzky_golay'
+            return 'savitzky_golay'
         elif self.smooth_type == self.SMOOTH_LPF:
-            'lpf'
+            return 'lpf'
         elif self.smooth_type == self.SMOOTH_NONE:
             return 'none'
         else:
@@ -209,11 +352,59 @@ class EnergyODF(OnsetDetectionFunction):
     def __init__(self):
         OnsetDetectionFunction.__init__(self)
         self.prev_energy = 0.0
+        # If True, process_frame assumes that each frame starts hop_size
+        # samples after the previous one, and only squares the new samples.
+        self.consecutive_frames = False
+        self._chunk_energies = None
+
+    def set_frame_size(self, frame_size):
+        self._frame_size = frame_size
+        self._chunk_energies = None
+
+    def set_hop_size(self, hop_size):
+        self._hop_size = hop_size
+        self._chunk_energies = None
+
+    def _frame_energy(self, frame):
+        # Frames are split into chunks that evenly divide both the frame and
+        # hop sizes, and the energy of each chunk in the current frame is
+        # saved. Each new frame then only adds hop_size samples worth of
+        # chunks, and the frame energy is the sum of the chunk energies.
+        # If the chunks are so small that this is no faster than summing the
+        # frame, the frame is summed directly.
+        chunk_size = gcd(self.frame_size, self.hop_size)
+        num_chunks = self.frame_size / chunk_size
+        if (not self.consecutive_frames or
+                self.hop_size + num_chunks >= self.frame_size):
+            return np.dot(frame, frame)
+        if self._chunk_energies is None:
+            chunks = np.reshape(frame, (-1, chunk_size))
+            self._chunk_energies = np.sum(chunks * chunks, axis=1)
+        else:
+            new_samples = min(self.hop_size, self.frame_size)
+            chunks = np.reshape(frame[len(frame) - new_samples:],
+                                (-1, chunk_size))
+            n = len(chunks)
+            self._chunk_energies[:-n] = self._chunk_energies[n:]
+            self._chunk_energies[-n:] = np.sum(chunks * chunks, axis=1)
+        return np.sum(self._chunk_energies)
+
+    def _process_block(self, signal):
+        # get the energy of each frame from a cumulative sum of the squared
+        # signal, so overlapping samples are only squared and summed once.
+        # The sum is always accumulated in double precision.
+        squares = np.zeros(len(signal) + 1, dtype=np.double)
+        np.cumsum(signal * signal, out=squares[1:])
+        starts = np.arange(0, len(signal) - self.frame_size + 1,
+                           self.hop_size)
+        energies = squares[starts + self.frame_size] - squares[starts]
+        diffs = np.abs(np.diff(np.hstack((self.prev_energy, energies))))
+        self.prev_energy = energies[-1]
+        self._chunk_energies = None
+        return diffs
 
     def process_frame(self, frame):
-        energy = 0.0
-        for sample in frame:
-            energy += (sample * sample)
+        energy = self._frame_energy(frame)
         diff = abs(energy - self.prev_energy)
         self.prev_energy = energy
         return diff
@@ -222,77 +413,97 @@ class EnergyODF(OnsetDetectionFunction):
 class SpectralDifferenceODF(OnsetDetectionFunction):
     def __init__(self):
         OnsetDetectionFunction.__init__(self)
-        self.window = np.hanning(self.frame_size)
+        self.window = fft.window(self.frame_size, dtype=self.dtype)
         self.num_bins = (self.frame_size / 2) + 1
-        self.prev_amps = np.zeros(self.num_bins)
+        self.prev_amps = np.zeros(self.num_bins, dtype=self.dtype)
 
     def set_frame_size(self, frame_size):
         self._frame_size = frame_size
-        self.window = np.hanning(frame_size)
+        self.window = fft.window(frame_size, dtype=self.dtype)
         self.num_bins = (frame_size / 2) + 1
-        self.prev_amps = np.zeros(self.num_bins)
+        self.prev_amps = np.zeros(self.num_bins, dtype=self.dtype)
+
+    def process_spectra(self, spectra):
+        '''Return the spectral difference for each row of the 2D array of
+        spectra, treating the rows as consecutive frames.'''
+        if not len(spectra):
+            return np.zeros(0)
+        amps = np.abs(spectra)
+        # calculate the amplitude differences between bins from consecutive
+        # frames, starting with the last frame of the previous call
+        diffs = np.abs(np.diff(np.vstack((self.prev_amps, amps)), axis=0))
+        self.prev_amps = amps[-1].copy()
+        return np.sum(diffs, axis=1)
+
+    def _process_block(self, signal):
+        return self.process_spectra(spectra(signal, self.window,
+                                            self.hop_size))
 
     def process_frame(self, frame):
         # fft
-        spectrum = np.fft.rfft(frame * self.window)
-        # calculate spectral difference for each bin
-        sum = 0.0
-        for bin in range(self.num_bins):
-            real = spectrum[bin].real
-            imag = spectrum[bin].imag
-            amp = np.sqrt((real * real) + (imag * imag))
-            sum += np.abs(amp - self.prev_amps[bin])
-            self.prev_amps[bin] = amp
-        return sum
+        spectrum = fft.rfft(frame * self.window)
+        return self.process_spectra(spectrum[np.newaxis])[0]
 
 
 class ComplexODF(OnsetDetectionFunction):
     def __init__(self):
         OnsetDetectionFunction.__init__(self)
-        self.window = np.hanning(self.frame_size)
+        self.window = fft.window(self.frame_size, dtype=self.dtype)
         self.num_bins = (self.frame_size / 2) + 1
-        self.prev_mags = np.zeros(self.num_bins)
-        self.prev_phases = np.zeros(self.num_bins)
-        self.prev_phases2 = np.zeros(self.num_bins)
-        self.prediction = np.zeros(self.num_bins, dtype=np.complex)
+        self.prev_mags = np.zeros(self.num_bins, dtype=self.dtype)
+        self.prev_phases = np.zeros(self.num_bins, dtype=self.dtype)
+        self.prev_phases2 = np.zeros(self.num_bins, dtype=self.dtype)
+        self.prediction = np.zeros(self.num_bins,
+                                   dtype=fft.complex_dtype(self.dtype))
 
     def set_frame_size(self, frame_size):
         self._frame_size = frame_size
-        self.window = np.hanning(frame_size)
+        self.window = fft.window(frame_size, dtype=self.dtype)
         self.num_bins = (frame_size / 2) + 1
-        self.prev_mags = np.zeros(self.num_bins)
-        self.prev_phases = np.zeros(self.num_bins)
-        self.prev_phases2 = np.zeros(self.num_bins)
-        self.prediction = np.zeros(self.num_bins, dtype=np.complex)
+        self.prev_mags = np.zeros(self.num_bins, dtype=self.dtype)
+        self.prev_phases = np.zeros(self.num_bins, dtype=self.dtype)
+        self.prev_phases2 = np.zeros(self.num_bins, dtype=self.dtype)
+        self.prediction = np.zeros(self.num_bins,
+                                   dtype=fft.complex_dtype(self.dtype))
+
+    def process_spectra(self, spectra):
+        '''Return the complex difference for each row of the 2D array of
+        spectra, treating the rows as consecutive frames.'''
+        if not len(spectra):
+            return np.zeros(0)
+        # prepend the magnitudes and phases of the previous frames, so that
+        # row i of mags and row i + 1 of phases are the values 1 frame
+        # before spectra[i]
+        mags = np.vstack((self.prev_mags, np.abs(spectra)))
+        phases = np.vstack((self.prev_phases2, self.prev_phases,
+                            np.angle(spectra)))
+        # magnitude prediction is just the previous magnitude
+        # phase prediction is the previous phase plus the difference
+        # between the previous two frames
+        predicted_phases = (2 * phases[1:-1]) - phases[:-2]
+        # bring it into the range +- pi
+        predicted_phases -= 2 * np.pi * \
+            np.round(predicted_phases / (2 * np.pi))
+        # convert back into the complex domain to calculate stationarities
+        predictions = mags[:-1] * (np.cos(predicted_phases) +
+                                   1j * np.sin(predicted_phases))
+        # get stationarity measures in the complex domain
+        cd = np.sum(np.abs(predictions - spectra), axis=1)
+        # update previous phase info for the next frame
+        self.prediction = predictions[-1].copy()
+        self.prev_mags = mags[-1].copy()
+        self.prev_phases = phases[-1].copy()
+        self.prev_phases2 = phases[-2].copy()
+        return cd
+
+    def _process_block(self, signal):
+        return self.process_spectra(spectra(signal, self.window,
+                                            self.hop_size))
 
     def process_frame(self, frame):
         # fft
-        spectrum = np.fft.rfft(frame * self.window)
-        # calculate complex difference for each bin
-        cd = 0.0
-        for bin in range(self.num_bins):
-            # magnitude prediction is just the previous magnitude
-            # phase prediction is the previous phase plus the difference
-            # between the previous two frames
-            predicted_phase = (2 * self.prev_phases[bin]) - \
-                self.prev_phases2[bin]
-            # bring it into the range +- pi
-            predicted_phase -= 2 * np.pi * \
-                np.round(predicted_phase / (2 * np.pi))
-            # convert back into the complex domain to calculate stationarities
-            self.prediction[bin] = toRectangular(self.prev_mags[bin],
-                                                 predicted_phase)
-            # get stationarity measures in the complex domain
-            real = (self.prediction[bin].real - spectrum[bin].real)
-            real = real * real
-            imag = (self.prediction[bin].imag - spectrum[bin].imag)
-            imag = imag * imag
-            cd += np.sqrt(real + imag)
-            # update previous phase info for the next frame
-            self.prev_phases2[bin] = self.prev_phases[bin]
-            self.prev_mags[bin], self.prev_phases[bin] = \
-                toPolar(spectrum[bin].real, spectrum[bin].imag)
-        return cd
+        spectrum = fft.rfft(frame * self.window)
+        return self.process_spectra(spectrum[np.newaxis])[0]
 
 
 class LinearPredictionODF(OnsetDetectionFunction):
@@ -312,6 +523,14 @@ class LinearPredictionODF(OnsetDetectionFunction):
 
     def set_order(self, order):
         self._order = order
+        self.init()
+
+    def set_dtype(self, dtype):
+        OnsetDetectionFunction.set_dtype(self, dtype)
+        self.init()
+
+    def init(self):
+        pass
 
     def get_coefs(self, samples, order):
         if self.method == self.AUTOCORRELATION:
@@ -328,83 +547,105 @@ class LinearPredictionODF(OnsetDetectionFunction):
             return lp.predict(samples, self.get_coefs(samples, order), 1)[0]
         return lp.predict(samples, self.get_coefs(samples, self.order), 1)[0]
 
+    def get_predictions(self, samples):
+        '''Return the predicted next value of each row of the 2D array
+        samples. With the Burg method, all rows are solved at once.'''
+        if self.method == self.BURG:
+            return lp.batch_predict(samples, lp.batch_burg(samples,
+                                                           self.order))
+        return np.array([self.get_prediction(s) for s in samples])
+
 
 class LPEnergyODF(LinearPredictionODF):
     def __init__(self):
         LinearPredictionODF.__init__(self)
-        self.prev_values = np.zeros(self.order)
+        self.init()
+
+    def init(self):
+        self.prev_values = HistoryBuffer(self.order, dtype=self.dtype)
 
     def process_frame(self, frame):
-        energy = 0.0
-        for sample in frame:
-            energy += (sample * sample)
-        odf = abs(energy - self.get_prediction(self.prev_values))
-        self.prev_values = np.hstack((self.prev_values[1:], energy))
+        energy = np.dot(frame, frame)
+        odf = abs(energy - self.get_prediction(self.prev_values.values()))
+        self.prev_values.append(energy)
         return odf
 
 
 class LPSpectralDifferenceODF(LinearPredictionODF):
     def __init__(self):
         LinearPredictionODF.__init__(self)
-        self.window = np.hanning(self.frame_size)
+        self.init()
+
+    def init(self):
+        self.window = fft.window(self.frame_size, dtype=self.dtype)
         self.num_bins = (self.frame_size / 2) + 1
-        self.prev_amps = np.zeros((self.order + 1, self.num_bins))
+        self.prev_amps = HistoryBuffer(self.order, (self.num_bins,),
+                                       self.dtype)
 
     def set_frame_size(self, frame_size):
         self._frame_size = frame_size
-        self.window = np.hanning(frame_size)
-        self.num_bins = (frame_size / 2) + 1
-        self.prev_amps = np.zeros((self.order + 1, self.num_bins))
+        self.init()
+
+    def process_spectra(self, spectra):
+        '''Return the ODF value for each row of the 2D array of spectra,
+        treating the rows as consecutive frames.'''
+        values = np.zeros(len(spectra), dtype=self.dtype)
+        for i, amps in enumerate(np.abs(spectra)):
+            # predict the amplitude of every bin from its previous amplitudes
+            predictions = self.get_predictions(self.prev_amps.values().T)
+            values[i] = np.sum(np.abs(predictions - amps))
+            self.prev_amps.append(amps)
+        return values
+
+    def _process_block(self, signal):
+        return self.process_spectra(spectra(signal, self.window,
+                                            self.hop_size))
 
     def process_frame(self, frame):
         # fft
-        spectrum = np.fft.rfft(frame * self.window)
-        sum = 0.0
-        for bin in range(self.num_bins):
-            real = spectrum[bin].real
-            imag = spectrum[bin].imag
-            amp = np.sqrt((real * real) + (imag * imag))
-            samples = self.prev_amps[0:self.order, bin]
-            sum += np.abs(self.get_prediction(samples) - amp)
-            self.prev_amps[-1][bin] = amp
-        # move prev amps back 1 frame
-        self.prev_amps = np.vstack((self.prev_amps[1:],
-                                    np.zeros(self.num_bins)))
-        return sum
+        spectrum = fft.rfft(frame * self.window)
+        return self.process_spectra(spectrum[np.newaxis])[0]
 
 
 class LPComplexODF(LinearPredictionODF):
     def __init__(self):
         LinearPredictionODF.__init__(self)
-        self.window = np.hanning(self.frame_size)
+        self.init()
+
+    def init(self):
+        self.window = fft.window(self.frame_size, dtype=self.dtype)
         self.num_bins = (self.frame_size / 2) + 1
-        self.prev_frame = np.zeros(self.num_bins, dtype=np.complex)
-        self.distances = np.zeros((self.order + 1, self.num_bins))
+        self.prev_frame = np.zeros(self.num_bins,
+                                   dtype=fft.complex_dtype(self.dtype))
+        self.distances = HistoryBuffer(self.order, (self.num_bins,),
+                                       self.dtype)
 
     def set_frame_size(self, frame_size):
         self._frame_size = frame_size
-        self.window = np.hanning(frame_size)
-        self.num_bins = (frame_size / 2) + 1
-        self.prev_frame = np.zeros(self.num_bins, dtype=np.complex)
-        self.distances = np.zeros((self.order + 1, self.num_bins))
+        self.init()
+
+    def process_spectra(self, spectra):
+        '''Return the ODF value for each row of the 2D array of spectra,
+        treating the rows as consecutive frames.'''
+        values = np.zeros(len(spectra), dtype=self.dtype)
+        for i, spectrum in enumerate(spectra):
+            # calculate complex differences
+            distances = np.abs(spectrum - self.prev_frame)
+            # predict the distance for every bin from its previous distances
+            predictions = self.get_predictions(self.distances.values().T)
+            values[i] = np.sum(np.abs(predictions - distances))
+            self.distances.append(distances)
+            self.prev_frame = spectrum
+        return values
+
+    def _process_block(self, signal):
+        return self.process_spectra(spectra(signal, self.window,
+                                            self.hop_size))
 
     def process_frame(self, frame):
         # fft
-        spectrum = np.fft.rfft(frame * self.window)
-        # calculate complex differences
-        sum = 0.0
-        for bin in range(self.num_bins):
-            distance = np.sqrt(
-                (spectrum[bin].real - self.prev_frame[bin].real) ** 2 +
-                (spectrum[bin].imag - self.prev_frame[bin].imag) ** 2
-            )
-            samples = self.distances[0:self.order, bin]
-            sum += np.abs(self.get_prediction(samples) - distance)
-            self.distances[-1][bin] = distance
-            self.prev_frame[bin] = spectrum[bin]
-        self.distances = np.vstack((self.distances[1:],
-                                    np.zeros(self.num_bins)))
-        return sum
+        spectrum = fft.rfft(frame * self.window)
+        return self.process_spectra(spectrum[np.newaxis])[0]
 
 
 class PeakODF(OnsetDetectionFunction):
@@ -414,7 +655,8 @@ class PeakODF(OnsetDetectionFunction):
         self.pd = mq.MQPeakDetection(self._max_peaks, self._sampling_rate,
                                      self._frame_size)
         self.pt = mq.MQPartialTracking(self._max_peaks)
-        self.window = np.hanning(self.frame_size)
+        self.prev_peaks = np.zeros(0, dtype=mq.peak_dtype)
+        self.window = fft.window(self.frame_size, dtype=self.dtype)
         self.num_bins = (self.frame_size / 2) + 1
 
     max_peaks = property(lambda self: self.get_max_peaks(),
@@ -428,6 +670,7 @@ class PeakODF(OnsetDetectionFunction):
         self.pd = mq.MQPeakDetection(self._max_peaks, self._sampling_rate,
                                      self._frame_size)
         self.pt = mq.MQPartialTracking(self._max_peaks)
+        self.prev_peaks = np.zeros(0, dtype=mq.peak_dtype)
 
     def set_sampling_rate(self, sampling_rate):
         self._sampling_rate = sampling_rate
@@ -436,7 +679,7 @@ class PeakODF(OnsetDetectionFunction):
 
     def set_frame_size(self, frame_size):
         self._frame_size = frame_size
-        self.window = np.hanning(frame_size)
+        self.window = fft.window(frame_size, dtype=self.dtype)
         self.num_bins = (frame_size / 2) + 1
         self.pd = mq.MQPeakDetection(self._max_peaks, self._sampling_rate,
                                      self._frame_size)
@@ -444,17 +687,47 @@ class PeakODF(OnsetDetectionFunction):
     def get_distance(self, peak1, peak2):
         return 0.0
 
+    def get_distances(self, peaks, prev_peaks, matched):
+        '''
+        Return the distance between each peak in the structured array peaks
+        and the matching peak in the previous frame, prev_peaks.
+        matched is False for peaks that have no match.
+        By default get_distance is called for each peak, with Peak objects
+        (peak2 is None if there is no match). Subclasses can override this
+        to calculate all of the distances at once.
+        '''
+        distances = np.zeros(len(peaks))
+        for i, (peak1, peak2) in enumerate(zip(mq.array_to_peaks(peaks),
+                                               mq.array_to_peaks(prev_peaks))):
+            distances[i] = self.get_distance(peak1,
+                                             peak2 if matched[i] else None)
+        return distances
+
+    def process_spectra(self, spectra):
+        '''Return the ODF value for each row of the 2D array of spectra,
+        treating the rows as consecutive frames.'''
+        values = np.zeros(len(spectra), dtype=self.dtype)
+        for i, spectrum in enumerate(spectra):
+            peaks = self.pd.find_peak_array(spectrum)
+            prev_indices = self.pt.track_peak_array(peaks)
+            matched = prev_indices >= 0
+            prev_peaks = np.zeros(len(peaks), dtype=mq.peak_dtype)
+            prev_peaks[matched] = self.prev_peaks[prev_indices[matched]]
+            self.prev_peaks = peaks
+
+            # calculate odf
+            values[i] = np.sum(self.get_distances(peaks, prev_peaks,
+                                                  matched))
+        return values
+
+    def _process_block(self, signal):
+        return self.process_spectra(spectra(signal, self.window,
+                                            self.hop_size))
+
     def process_frame(self, frame):
         # fft
-        spectrum = np.fft.rfft(frame * self.window)
-        peaks = self.pd.find_peaks(spectrum)
-        tracked_peaks = self.pt.track_peaks(peaks)
-
-        # calculate odf
-        sum = 0.0
-        for peak in tracked_peaks:
-            sum += self.get_distance(peak, peak.prev_peak)
-        return sum
+        spectrum = fft.rfft(frame * self.window)
+        return self.process_spectra(spectrum[np.newaxis])[0]
 
 
 class PeakAmpDifferenceODF(PeakODF):
@@ -467,6 +740,11 @@ class PeakAmpDifferenceODF(PeakODF):
         else:
             return np.abs(peak1.amplitude - peak2.amplitude)
 
+    def get_distances(self, peaks, prev_peaks, matched):
+        return np.where(matched,
+                        np.abs(peaks['amplitude'] - prev_peaks['amplitude']),
+                        peaks['amplitude'])
+
     def max_odf_value(self):
         '''
         As amplitude values are assumed to be floating point numbers
@@ -486,6 +764,11 @@ class PeakFreqDifferenceODF(PeakODF):
         else:
             return np.abs(peak1.frequency - peak2.frequency)
 
+    def get_distances(self, peaks, prev_peaks, matched):
+        return np.where(matched,
+                        np.abs(peaks['frequency'] - prev_peaks['frequency']),
+                        peaks['frequency'])
+
 
 class PeakDifferenceODF(PeakODF):
     def __init__(self):
@@ -498,6 +781,14 @@ class PeakDifferenceODF(PeakODF):
             return np.sqrt((peak1.amplitude - peak2.amplitude) ** 2 +
                            (peak1.frequency - peak2.frequency) ** 2)
 
+    def get_distances(self, peaks, prev_peaks, matched):
+        return np.where(matched,
+                        np.sqrt((peaks['amplitude'] -
+                                 prev_peaks['amplitude']) ** 2 +
+                                (peaks['frequency'] -
+                                 prev_peaks['frequency']) ** 2),
+                        peaks['amplitude'])
+
 
 class UnmatchedPeaksODF(PeakODF):
     def __init__(self):
@@ -508,3 +799,127 @@ class UnmatchedPeaksODF(PeakODF):
             return peak1.amplitude
         else:
             return 0.0
+
+    def get_distances(self, peaks, prev_peaks, matched):
+        return np.where(matched, 0.0, peaks['amplitude'])
+
+
+class SpectralODFBank(OnsetDetectionFunction):
+    '''
+    Calculates several spectral ODFs from a single set of spectra.
+    Each frame is windowed and transformed once, and the spectrum is passed
+    to the process_spectra method of every ODF that has been added.
+    Frame size, hop size and sampling rate are set on all of the ODFs, but
+    each ODF keeps its own smoothing settings.
+    Only the Python ODFs accept spectra, so the C++ ODFs can not be added.
+    '''
+    def __init__(self):
+        OnsetDetectionFunction.__init__(self)
+        self.window = fft.window(self.frame_size, dtype=self.dtype)
+        self.odfs = {}
+
+    def add_odf(self, name, odf):
+        if not hasattr(odf, 'process_spectra'):
+            raise Exception('%s does not accept spectra' %
+                            odf.__class__.__name__)
+        odf.set_sampling_rate(self.sampling_rate)
+        odf.set_frame_size(self.frame_size)
+        odf.set_hop_size(self.hop_size)
+        odf.set_dtype(self.dtype)
+        self.odfs[name] = odf
+
+    def remove_odf(self, name):
+        del self.odfs[name]
+
+    def set_sampling_rate(self, sampling_rate):
+        self._sampling_rate = sampling_rate
+        for odf in self.odfs.values():
+            odf.set_sampling_rate(sampling_rate)
+
+    def set_frame_size(self, frame_size):
+        self._frame_size = frame_size
+        self.window = fft.window(frame_size, dtype=self.dtype)
+        for odf in self.odfs.values():
+            odf.set_frame_size(frame_size)
+
+    def set_hop_size(self, hop_size):
+        self._hop_size = hop_size
+        for odf in self.odfs.values():
+            odf.set_hop_size(hop_size)
+
+    def set_dtype(self, dtype):
+        self._dtype = np.dtype(dtype)
+        self.window = fft.window(self.frame_size, dtype=self.dtype)
+        for odf in self.odfs.values():
+            odf.set_dtype(dtype)
+
+    def process_frame(self, frame):
+        '''Return a dict containing the value of each ODF for frame.'''
+        spectrum = fft.rfft(frame * self.window)[np.newaxis]
+        return dict((name, odf.process_spectra(spectrum)[0])
+                    for name, odf in self.odfs.iteritems())
+
+    def _process_block(self, signal):
+        '''Return a dict containing the values of each ODF for every
+        complete frame in signal.'''
+        block_spectra = spectra(signal, self.window, self.hop_size)
+        return dict((name, odf.process_spectra(block_spectra))
+                    for name, odf in self.odfs.iteritems())
+
+    def _detection_functions(self, detection_functions, size):
+        '''Return detection_functions with a new array of the given size for
+        each ODF that does not have one, checking the size of the others.'''
+        if detection_functions is None:
+            detection_functions = {}
+        for name in self.odfs:
+            if not name in detection_functions:
+                detection_functions[name] = np.zeros(size, dtype=self.dtype)
+            if len(detection_functions[name]) < size:
+                msg = 'detection function %s not large enough: %d ' + \
+                    '(need %d)'
+                raise Exception(msg % (name, len(detection_functions[name]),
+                                       size))
+        return detection_functions
+
+    def process_frames(self, signal, start, count, detection_functions):
+        '''
+        Calculate the values of each ODF for up to count consecutive frames,
+        as OnsetDetectionFunction.process_frames does. The values are written
+        to the arrays in the detection_functions dict, and arrays of size count
+        are added to it for any ODFs that are missing.
+        Returns the number of frames processed.
+        '''
+        if start < 0:
+            raise Exception('Start position must not be negative')
+        self._detection_functions(detection_functions, count)
+
+        num_frames = max(0, (len(signal) - start - self.frame_size) /
+                         self.hop_size + 1)
+        num_frames = min(count, num_frames)
+        if not num_frames:
+            return 0
+        end = start + ((num_frames - 1) * self.hop_size) + self.frame_size
+        for i, n, block in self._blocks(signal[start:end]):
+            for name, values in self._process_block(block).iteritems():
+                detection_functions[name][i:i + n] = values
+        return num_frames
+
+    def process(self, signal, detection_functions=None):
+        '''
+        Return a dict containing the detection function of each ODF.
+        Detection functions are written to the arrays in the optional
+        detection_functions dict, otherwise new arrays of size
+        len(signal) / hop_size are created.
+        '''
+        detection_functions = self._detection_functions(
+            detection_functions, len(signal) / self.hop_size
+        )
+
+        for i, n, block in self._blocks(signal):
+            for name, values in self._process_block(block).iteritems():
+                detection_functions[name][i:i + n] = values
+
+        for name, odf in self.odfs.iteritems():
+            odf._post_process(detection_functions[name])
+        self.det_func = detection_functions
+        return detection_functions
@@ -0,0 +1,83 @@
+// Interface shared by the double (pydetectionfunctions) and single
+// (pydetectionfunctions_float) precision modules.
+%{
+    #include "detectionfunctions.h"
+    #include "mq.h"
+    #define SWIG_FILE_WITH_INIT
+%}
+
+%include "numpy.i"
+
+%init 
+%{
+    import_array();
+%}
+
+%include "precision.h"
+
+// raise C++ exceptions as Python exceptions
+%exception {
+    try {
+        $action
+    }
+    catch(modal::Exception& e) {
+        PyErr_SetString(PyExc_Exception, e.what());
+        SWIG_fail;
+    }
+}
+
+// Release the GIL while the named functions run, so that ODFs can be used
+// from several Python threads at once. The functions must not use any Python
+// objects, and each ODF instance should only be used by one thread at a time.
+// They may plan FFTs (process clones the ODF when it uses several threads),
+// which is safe as all FFTW planning holds the lock in plan_fft.
+%define %release_gil(name)
+%exception name {
+    PyThreadState* _save = PyEval_SaveThread();
+    try {
+        $action
+    }
+    catch(modal::Exception& e) {
+        PyEval_RestoreThread(_save);
+        PyErr_SetString(PyExc_Exception, e.what());
+        SWIG_fail;
+    }
+    PyEval_RestoreThread(_save);
+}
+%enddef
+
+%release_gil(process)
+%release_gil(process_frame)
+%release_gil(process_frames)
+%release_gil(burg)
+%release_gil(linear_prediction)
+%release_gil(find_peaks)
+%release_gil(track_peaks)
+
+%apply(int DIM1, sample* INPLACE_ARRAY1)
+{
+    (int odf_size, sample* odf),
+    (int signal_size, sample* signal),
+    (int num_coefs, sample* coefs),
+    (int num_predictions, sample* predictions),
+    (int num_bins, sample* amplitudes),
+    (int max_peaks, int* peaks),
+    (int num_amplitudes, sample* amplitudes),
+    (int num_frequencies, sample* frequencies),
+    (int num_phases, sample* phases)
+}
+
+%apply(int DIM1, int* INPLACE_ARRAY1)
+{
+    (int max_peaks, int* peaks),
+    (int num_bins, int* bins),
+    (int num_prev, int* prev)
+}
+
+%ignore plan_fft;
+%ignore plan_fft_batch;
+%ignore destroy_fft_plan;
+%newobject *::clone;
+
+%include "detectionfunctions.h" 
+%include "mq.h"
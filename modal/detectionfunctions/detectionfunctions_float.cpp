@@ -0,0 +1,3 @@
+// Single precision build of detectionfunctions.cpp
+#define MODAL_SINGLE_PRECISION
+#include "detectionfunctions.cpp"
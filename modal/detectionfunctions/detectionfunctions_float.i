@@ -0,0 +1,13 @@
+%module pydetectionfunctions_float
+
+// The classes have the same names as those in pydetectionfunctions, so use
+// a separate SWIG type table to stop the two modules sharing type info.
+%begin
+%{
+    #define SWIG_TYPE_TABLE pydetectionfunctions_float
+    #define MODAL_SINGLE_PRECISION
+%}
+
+#define MODAL_SINGLE_PRECISION
+
+%include "detectionfunctions_common.i"
@@ -0,0 +1,139 @@
+'''
+Shared analysis windows and real FFTs for the Python ODFs.
+
+Windows are cached by frame size, window type and dtype, so ODF instances
+with the same frame size share one read-only window. The FFT library is
+selected with set_backend. By default the fastest available library is used,
+in the order pyFFTW, scipy.fft then NumPy.
+'''
+import threading
+from collections import OrderedDict
+import numpy as np
+
+try:
+    import scipy.fft as scipy_fft
+except ImportError:
+    scipy_fft = None
+
+try:
+    import pyfftw
+    import pyfftw.builders
+except ImportError:
+    pyfftw = None
+
+NUMPY = 'numpy'
+SCIPY = 'scipy'
+PYFFTW = 'pyfftw'
+
+HANNING = 'hanning'
+HAMMING = 'hamming'
+BLACKMAN = 'blackman'
+BARTLETT = 'bartlett'
+
+_windows = {}
+_plans = threading.local()
+_backend = NUMPY
+_workers = 1
+# incremented by set_backend, so that every thread discards its cached plans
+_plans_generation = 0
+# maximum number of pyFFTW plans cached by each thread. The last block of a
+# signal usually has a shape of its own, so plans for unused shapes are
+# discarded, least recently used first.
+_max_plans = 8
+
+
+# -----------------------------------------------------------------------------
+# Windows
+
+
+def window(frame_size, window_type=HANNING, dtype=np.double):
+    '''Return a read-only window of the given size, type and dtype.'''
+    key = (frame_size, window_type, np.dtype(dtype))
+    if not key in _windows:
+        if not window_type in [HANNING, HAMMING, BLACKMAN, BARTLETT]:
+            raise Exception('Unknown window type: %s' % window_type)
+        w = getattr(np, window_type)(frame_size).astype(dtype)
+        w.setflags(write=False)
+        _windows[key] = w
+    return _windows[key]
+
+
+def complex_dtype(dtype):
+    '''Return the type of the spectrum of real samples of type dtype.'''
+    return np.result_type(dtype, np.complex64)
+
+
+# -----------------------------------------------------------------------------
+# Backends
+
+
+def available_backends():
+    backends = [NUMPY]
+    if scipy_fft:
+        backends.append(SCIPY)
+    if pyfftw:
+        backends.append(PYFFTW)
+    return backends
+
+
+def get_backend():
+    return _backend
+
+
+def get_workers():
+    return _workers
+
+
+def set_backend(backend=None, workers=1):
+    '''
+    Select the library used by rfft, and the number of threads that it can
+    use (ignored by NumPy). If backend is None, the fastest available library
+    is used. If the requested library is not available, NumPy is used.
+    '''
+    global _backend, _workers, _plans_generation
+    if backend is None:
+        backend = available_backends()[-1]
+    if not backend in available_backends():
+        print 'Warning: FFT backend %s not available, using %s' % \
+            (backend, NUMPY)
+        backend = NUMPY
+    _backend = backend
+    _workers = workers
+    _plans_generation += 1
+
+
+def _pyfftw_plan(shape, dtype):
+    '''Return a cached pyFFTW plan for arrays of the given shape and type.
+    Plans share input and output arrays, so each thread has its own.'''
+    if getattr(_plans, 'generation', None) != _plans_generation:
+        _plans.cache = OrderedDict()
+        _plans.generation = _plans_generation
+    key = (shape, dtype)
+    if key in _plans.cache:
+        plan = _plans.cache.pop(key)
+    else:
+        plan = pyfftw.builders.rfft(
+            pyfftw.empty_aligned(shape, dtype=dtype), threads=_workers
+        )
+        if len(_plans.cache) >= _max_plans:
+            _plans.cache.popitem(last=False)
+    _plans.cache[key] = plan
+    return plan
+
+
+def rfft(frames):
+    '''Return the real FFT of frames, along the last axis.
+    Single precision frames give a single precision (np.complex64) result.'''
+    if _backend == PYFFTW:
+        frames = np.asarray(frames)
+        # plans reuse their output array, so copy it
+        return _pyfftw_plan(frames.shape, frames.dtype)(frames).copy()
+    elif _backend == SCIPY:
+        return scipy_fft.rfft(frames, workers=_workers)
+    # NumPy always calculates the FFT in double precision
+    frames = np.asarray(frames)
+    return np.fft.rfft(frames).astype(complex_dtype(frames.dtype),
+                                      copy=False)
+
+
+set_backend()
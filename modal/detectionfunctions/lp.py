@@ -86,6 +86,50 @@ def burg(signal, order):
     return coefs[1:]
 
 
+def batch_burg(signals, order):
+    '''Using the burg method, calculate order coefficients for each row
+    of the 2D array signals. All rows are solved together, so this is
+    much faster than calling burg for each row.
+    Returns a 2D numpy array with one row of coefficients per signal.'''
+    signals = np.asarray(signals, dtype=np.double)
+    num_signals = len(signals)
+    coefs = np.ones((num_signals, 1))
+    # initialise f and b - the forward and backwards predictors
+    f = signals.copy()
+    b = signals.copy()
+    # burg algorithm
+    for k in range(order):
+        # fk is f without the first column
+        fk = f[:, 1:]
+        # bk is b without the last column
+        bk = b[:, 0:b.shape[1] - 1]
+        # calculate mu, which is 0 for rows where it would divide by zero
+        fb_sum = np.sum(fk * bk, axis=1)
+        sum = np.sum((fk * fk) + (bk * bk), axis=1)
+        mu = np.zeros(num_signals)
+        np.divide(-2.0 * fb_sum, sum, out=mu, where=sum != 0)
+        mu = mu[:, np.newaxis]
+        # update coefs
+        # coefs[:, ::-1] reverses each row of coefs
+        zeros = np.zeros((num_signals, 1))
+        coefs = np.hstack((coefs, zeros)) + \
+            (mu * np.hstack((zeros, coefs[:, ::-1])))
+        # update f and b
+        f = fk + (mu * bk)
+        b = bk + (mu * fk)
+    return coefs[:, 1:]
+
+
+def batch_predict(signals, coefs):
+    '''Using Linear Prediction, return the estimated next value of each
+    row of the 2D array signals, using the corresponding row of coefs.
+    Returns a numpy array.'''
+    num_coefs = coefs.shape[1]
+    # past samples, most recent first
+    past_samples = signals[:, ::-1][:, 0:num_coefs]
+    return -np.sum(coefs * past_samples, axis=1)
+
+
 def predict(signal, coefs, num_predictions):
     '''Using Linear Prediction, return the estimated next num_predictions
     values of signal, using the given coefficients.
@@ -1,5 +1,8 @@
+#include <algorithm>
 #include "mq.h"
 
+using namespace modal;
+
 // ----------------------------------------------------------------------------
 // Initialisation and destruction
 
@@ -13,23 +16,37 @@ int init_mq(MQParameters* params) {
     hann_window(params->frame_size, params->window);
 
 	// allocate memory for FFT
-	params->fft_in = (sample*) fftw_malloc(sizeof(sample) *
-                                           params->frame_size);
-	params->fft_out = (fftw_complex*) fftw_malloc(sizeof(fftw_complex) *
-                                                  params->num_bins);
-	params->fft_plan = fftw_plan_dft_r2c_1d(params->frame_size, params->fft_in,
-                                            params->fft_out, FFTW_ESTIMATE);
+	params->fft_in = (sample*) FFTW(malloc)(sizeof(sample) *
+                                            params->frame_size);
+	params->fft_out = (FFTW(complex)*) FFTW(malloc)(sizeof(FFTW(complex)) *
+                                                    params->num_bins);
+	params->fft_plan = plan_fft(params->frame_size,
+                                params->fft_in, params->fft_out);
+
+    // allocate memory for the peaks of 2 frames. Peaks are local maxima
+    // between the first and last bins, so no more than half of the bins
+    // can be peaks.
+    params->max_frame_peaks = (params->num_bins / 2) + 1;
+    params->peaks = (Peak*) malloc(sizeof(Peak) * 2 *
+                                   params->max_frame_peaks);
+    params->peak_nodes = (PeakList*) malloc(sizeof(PeakList) * 2 *
+                                            params->max_frame_peaks);
+    params->largest_peaks = (Peak**) malloc(sizeof(Peak*) *
+                                            params->max_frame_peaks);
+    params->current_peaks = (Peak**) malloc(sizeof(Peak*) *
+                                            params->max_frame_peaks);
+    params->unmatched_below = (int*) malloc(sizeof(int) *
+                                            params->max_frame_peaks);
+    params->unmatched_above = (int*) malloc(sizeof(int) *
+                                            params->max_frame_peaks);
+    params->found_peaks = NULL;
+
     // set other variables to defaults
-    params->prev_peaks = NULL;
-    params->prev_peaks2 = NULL;
     reset_mq(params);
     return 0;
 }
 
 void reset_mq(MQParameters* params) {
-    delete_peak_list(params->prev_peaks2);
-    params->prev_peaks2 = NULL;
-    delete_peak_list(params->prev_peaks);
     params->prev_peaks = NULL;
 }
 
@@ -40,18 +57,41 @@ int destroy_mq(MQParameters* params) {
             params->window = NULL;
         }
         if(params->fft_in) {
-            fftw_free(params->fft_in);
+            FFTW(free)(params->fft_in);
             params->fft_in = NULL;
         }
         if(params->fft_out) {
-            fftw_free(params->fft_out);
+            FFTW(free)(params->fft_out);
             params->fft_out = NULL;
         }
-        fftw_destroy_plan(params->fft_plan);
+        destroy_fft_plan(params->fft_plan);
+        params->fft_plan = NULL;
 
-        delete_peak_list(params->prev_peaks2);
-        params->prev_peaks2 = NULL;
-        delete_peak_list(params->prev_peaks);
+        if(params->peaks) {
+            free(params->peaks);
+            params->peaks = NULL;
+        }
+        if(params->peak_nodes) {
+            free(params->peak_nodes);
+            params->peak_nodes = NULL;
+        }
+        if(params->largest_peaks) {
+            free(params->largest_peaks);
+            params->largest_peaks = NULL;
+        }
+        if(params->current_peaks) {
+            free(params->current_peaks);
+            params->current_peaks = NULL;
+        }
+        if(params->unmatched_below) {
+            free(params->unmatched_below);
+            params->unmatched_below = NULL;
+        }
+        if(params->unmatched_above) {
+            free(params->unmatched_above);
+            params->unmatched_above = NULL;
+        }
+        params->found_peaks = NULL;
         params->prev_peaks = NULL;
     }
     return 0;
@@ -60,71 +100,23 @@ int destroy_mq(MQParameters* params) {
 // ----------------------------------------------------------------------------
 // Peak Detection
 
-// Add new_peak to the doubly linked list of peaks, keeping peaks sorted
-// with the largest amplitude peaks at the start of the list
-void add_peak(Peak* new_peak, PeakList* peak_list) {
-    do {
-        if(peak_list->peak) {
-            if(peak_list->peak->amplitude > new_peak->amplitude) {
-                if(peak_list->next) {
-                    peak_list = peak_list->next;
-                }
-                else {
-                    PeakList* new_node = (PeakList*)malloc(sizeof(PeakList));
-                    new_node->peak = new_peak;
-                    new_node->prev = peak_list;
-                    new_node->next = NULL;
-                    peak_list->next = new_node;
-                    return;
-                }
-            }
-            else {
-                PeakList* new_node = (PeakList*)malloc(sizeof(PeakList));
-                new_node->peak = peak_list->peak;
-                new_node->prev = peak_list;
-                new_node->next = peak_list->next;
-                peak_list->next = new_node;
-                peak_list->peak = new_peak;
-                return;
-            }
-        }
-        else {
-            // should only happen for the first peak
-            peak_list->peak = new_peak;
-            return;
-        }
-    }
-    while(1);
-}
-
-// delete the given PeakList
-void delete_peak_list(PeakList* peak_list) {
-    while(peak_list && peak_list->next) {
-        if(peak_list->peak) {
-            free(peak_list->peak);
-            peak_list->peak = NULL;
-        }
-        PeakList* temp = peak_list->next;
-        free(peak_list);
-        peak_list = temp;
-    }
-
-    if(peak_list) {
-        if(peak_list->peak) {
-            free(peak_list->peak);
-            peak_list->peak = NULL;
-        }
-        peak_list->next = NULL;
-        peak_list->prev = NULL;
-        free(peak_list);
-        peak_list = NULL;
+// Order peaks by amplitude, largest first. Peaks with the same amplitude
+// are ordered by frequency, highest first.
+static bool larger_peak(const Peak* peak1, const Peak* peak2) {
+    if(peak1->amplitude != peak2->amplitude) {
+        return peak1->amplitude > peak2->amplitude;
     }
+    return peak1->bin > peak2->bin;
 }
 
 sample get_magnitude(sample x, sample y) {
     return sqrt((x*x) + (y*y));
 }
 
+static sample get_squared_magnitude(sample x, sample y) {
+    return (x*x) + (y*y);
+}
+
 sample get_phase(sample x, sample y) {
     return atan2(y, x);
 }
@@ -132,59 +124,100 @@ sample get_phase(sample x, sample y) {
 PeakList* find_peaks(int signal_size, sample* signal, MQParameters* params) {
     int i;
     int num_peaks = 0;
+    int num_largest_peaks;
     sample prev_amp, current_amp, next_amp;
-    PeakList* peak_list = (PeakList*)malloc(sizeof(PeakList));
-    peak_list->next = NULL;
-    peak_list->prev = NULL;
-    peak_list->peak = NULL;
+
+    // use the half of the peak memory that does not hold the peaks found
+    // by the last call
+    int offset = 0;
+    if(params->found_peaks &&
+       params->found_peaks < &params->peak_nodes[params->max_frame_peaks]) {
+        offset = params->max_frame_peaks;
+    }
+    Peak* peaks = &params->peaks[offset];
+    PeakList* peak_list = &params->peak_nodes[offset];
+
+    // the last peaks can no longer be linked to the peaks that are about
+    // to be overwritten
+    PeakList* current = params->found_peaks;
+    while(current && current->peak) {
+        current->peak->prev = NULL;
+        current = current->next;
+    }
+    // if the last peaks were not tracked, the previous peaks are about to
+    // be overwritten, so the new peaks can not be tracked
+    if(params->prev_peaks == peak_list) {
+        params->prev_peaks = NULL;
+    }
+    params->found_peaks = peak_list;
 
     // take fft of the signal
     memcpy(params->fft_in, signal, sizeof(sample)*params->frame_size);
     for(i = 0; i < params->frame_size; i++) {
         params->fft_in[i] *= params->window[i];
     }
-    fftw_execute(params->fft_plan);
+    FFTW(execute)(params->fft_plan);
 
-    // get initial magnitudes
-    prev_amp = get_magnitude(params->fft_out[0][0], params->fft_out[0][1]);
-    current_amp = get_magnitude(params->fft_out[1][0], params->fft_out[1][1]);
+    // Find all peaks in the amplitude spectrum. Squared magnitudes are
+    // compared, so the square root is only taken for the peaks.
+    sample threshold = params->peak_threshold;
+    if(threshold > 0) {
+        threshold *= threshold;
+    }
+    prev_amp = get_squared_magnitude(params->fft_out[0][0],
+                                     params->fft_out[0][1]);
+    current_amp = get_squared_magnitude(params->fft_out[1][0],
+                                        params->fft_out[1][1]);
 
-    // find all peaks in the amplitude spectrum
     for(i = 1; i < params->num_bins-1; i++) {
-        next_amp = get_magnitude(params->fft_out[i+1][0],
-                                 params->fft_out[i+1][1]);
+        next_amp = get_squared_magnitude(params->fft_out[i+1][0],
+                                         params->fft_out[i+1][1]);
 
         if((current_amp > prev_amp) &&
            (current_amp > next_amp) &&
-           (current_amp > params->peak_threshold)) {
-            Peak* p = (Peak*)malloc(sizeof(Peak));
-            p->amplitude = current_amp;
+           (current_amp > threshold)) {
+            Peak* p = &peaks[num_peaks];
+            p->amplitude = sqrt(current_amp);
             p->frequency = i * params->fundamental;
             p->phase = get_phase(params->fft_out[i][0], params->fft_out[i][1]);
             p->bin = i;
             p->next = NULL;
             p->prev = NULL;
-
-            add_peak(p, peak_list);
+            params->largest_peaks[num_peaks] = p;
             num_peaks++;
         }
         prev_amp = current_amp;
         current_amp = next_amp;
     }
 
-    // limit peaks to a maximum of max_peaks
+    // limit peaks to the max_peaks largest, in linear time
+    num_largest_peaks = num_peaks;
     if(num_peaks > params->max_peaks) {
-        PeakList* current = peak_list;
-        for(i = 0; i < params->max_peaks-1; i++) {
-            current = current->next;
-        }
-
-        delete_peak_list(current->next);
-        current->next = NULL;
-        num_peaks = params->max_peaks;
+        num_largest_peaks = std::max(params->max_peaks, 0);
+        std::nth_element(params->largest_peaks,
+                         params->largest_peaks + num_largest_peaks,
+                         params->largest_peaks + num_peaks, larger_peak);
     }
 
-    return sort_peaks_by_frequency(peak_list, num_peaks);
+    // Peaks were found in order of frequency, so sorting the largest peaks
+    // by their position in memory sorts them by frequency.
+    std::sort(params->largest_peaks,
+              params->largest_peaks + num_largest_peaks);
+
+    peak_list[0].peak = NULL;
+    peak_list[0].prev = NULL;
+    peak_list[0].next = NULL;
+    for(i = 0; i < num_largest_peaks; i++) {
+        params->largest_peaks[i]->index = i;
+        peak_list[i].peak = params->largest_peaks[i];
+        peak_list[i].prev = NULL;
+        peak_list[i].next = NULL;
+        if(i > 0) {
+            peak_list[i].prev = &peak_list[i - 1];
+            peak_list[i - 1].next = &peak_list[i];
+        }
+    }
+    return peak_list;
 }
 
 // ----------------------------------------------------------------------------
@@ -306,108 +339,176 @@ PeakList* sort_peaks_by_frequency(PeakList* peak_list, int num_peaks) {
 // ----------------------------------------------------------------------------
 // Partial Tracking
 
-// Find a candidate match for peak in frame if one exists. This is the closest
-// (in frequency) match that is within the matching interval.
-Peak* find_closest_match(Peak* p, PeakList* peak_list,
-                         MQParameters* params, int backwards) {
-    PeakList* current = peak_list;
-    Peak* match = NULL;
-    sample best_distance = 44100.0;
-    sample distance;
-
-    while(current && current->peak) {
-        if(backwards) {
-            if(current->peak->prev) {
-                current = current->next;
-                continue;
-            }
-        }
-        else {
-            if(current->peak->next) {
-                current = current->next;
-                continue;
-            }
-        }
-
-        distance = fabs(current->peak->frequency - p->frequency);
-        if((distance < params->matching_interval) &&
-           (distance < best_distance)) {
-            best_distance = distance;
-            match = current->peak;
-        }
-        current = current->next;
+// Returns true if p is the closest unmatched previous peak to match. The
+// previous peaks are sorted by frequency and all of the peaks after p are
+// unmatched, so the only peaks that can be closer are next (the peak after
+// p) and last_unmatched (the highest unmatched peak before p). If two
+// peaks are the same distance from match, the lower one is closest.
+static bool is_closest_match(Peak* p, Peak* match, Peak* next,
+                             Peak* last_unmatched) {
+    sample distance = fabs(p->frequency - match->frequency);
+    if(last_unmatched &&
+       fabs(last_unmatched->frequency - match->frequency) <= distance) {
+        return false;
     }
-
-    return match;
+    if(next && fabs(next->frequency - match->frequency) < distance) {
+        return false;
+    }
+    return true;
 }
 
-// Returns the closest unmatched peak in frame with a frequency less
-// than p.frequency.
-Peak* free_peak_below(Peak* p, PeakList* peak_list) {
-    PeakList* current = peak_list;
-    Peak* free_peak = NULL;
-    sample closest_frequency = 44100;
-
-    while(current && current->peak) {
-        if(current->peak != p) {
-            // if current peak is unmatched, and it is closer to p than the
-            // last unmatched peak that we saw, save it
-            if(!current->peak->prev &&
-               (current->peak->frequency < p->frequency) &&
-               (fabs(current->peak->frequency - p->frequency)
-                < closest_frequency)) {
-                closest_frequency = fabs(current->peak->frequency -
-                                         p->frequency);
-                free_peak = current->peak;
-            }
-        }
-        current = current->next;
+// Remove peak i from the doubly linked list of unmatched current peaks
+static void remove_unmatched(int i, int num_peaks, int* below, int* above,
+                             int* highest) {
+    if(below[i] >= 0) {
+        above[below[i]] = above[i];
+    }
+    if(above[i] < num_peaks) {
+        below[above[i]] = below[i];
+    }
+    else {
+        *highest = below[i];
     }
-    return free_peak;
 }
 
-
 // A simplified version of MQ Partial Tracking.
+//
+// Both frames are sorted by frequency, so the previous peaks are matched in
+// a single pass over the two frames. For each previous peak, the candidate
+// match is the closest unmatched peak in the current frame, which is one of
+// the two unmatched peaks either side of its frequency. If the previous peak
+// is also the closest unmatched previous peak to the candidate then they are
+// matched. Otherwise the previous peak is matched to the closest unmatched
+// current peak below the candidate, if that is within the matching interval.
 PeakList* track_peaks(PeakList* peak_list, MQParameters* params) {
-    PeakList* current = peak_list;
-
     // MQ algorithm needs 2 frames of data, so return if this is the
     // first frame
     if(params->prev_peaks) {
-        // find all matches for previous peaks in the current frame
-        current = params->prev_peaks;
-        while(current && current->peak) {
-            Peak* match = find_closest_match(
-                current->peak, peak_list, params, 1
-            );
-            if(match) {
-                Peak* closest_to_cand = find_closest_match(
-                    match, params->prev_peaks, params, 0
-                );
-                if(closest_to_cand != current->peak) {
+        // copy the current peaks into an array, with a doubly linked list
+        // (below and above) of the indices of the unmatched peaks
+        Peak** current = params->current_peaks;
+        int* below = params->unmatched_below;
+        int* above = params->unmatched_above;
+        int num_current = 0;
+        PeakList* node = peak_list;
+        while(node && node->peak) {
+            current[num_current] = node->peak;
+            below[num_current] = num_current - 1;
+            above[num_current] = num_current + 1;
+            num_current++;
+            node = node->next;
+        }
+        int highest_unmatched = num_current - 1;
+
+        // the first unmatched current peak at or above the frequency of
+        // the previous peak
+        int i = 0;
+        Peak* last_unmatched = NULL;
+
+        node = params->prev_peaks;
+        while(node && node->peak) {
+            Peak* p = node->peak;
+            Peak* next = node->next ? node->next->peak : NULL;
+
+            while(i < num_current && (current[i]->frequency < p->frequency ||
+                                      current[i]->prev)) {
+                i++;
+            }
+
+            // find the closest unmatched current peak within the matching
+            // interval, preferring the lower peak if they are equally close
+            int match = -1;
+            sample best_distance = 44100.0;
+            sample distance;
+            int lower = i < num_current ? below[i] : highest_unmatched;
+            if(lower >= 0) {
+                distance = fabs(current[lower]->frequency - p->frequency);
+                if((distance < params->matching_interval) &&
+                   (distance < best_distance)) {
+                    best_distance = distance;
+                    match = lower;
+                }
+            }
+            if(i < num_current) {
+                distance = fabs(current[i]->frequency - p->frequency);
+                if((distance < params->matching_interval) &&
+                   (distance < best_distance)) {
+                    best_distance = distance;
+                    match = i;
+                }
+            }
+
+            if(match >= 0) {
+                if(is_closest_match(p, current[match], next, last_unmatched)) {
+                    current[match]->prev = p;
+                    p->next = current[match];
+                    remove_unmatched(match, num_current, below, above,
+                                     &highest_unmatched);
+                }
+                else {
                     // see if the closest peak with lower frequency to the
                     // candidate is within the matching interval
-                    Peak* lower = free_peak_below(match, peak_list);
-                    if(lower) {
-                        if(fabs(lower->frequency - current->peak->frequency)
-                           < params->matching_interval) {
-                            lower->prev = current->peak;
-                            current->peak->next = lower;
-                        }
+                    lower = below[match];
+                    if(lower >= 0 &&
+                       fabs(current[lower]->frequency - p->frequency)
+                       < params->matching_interval) {
+                        current[lower]->prev = p;
+                        p->next = current[lower];
+                        remove_unmatched(lower, num_current, below, above,
+                                         &highest_unmatched);
                     }
                 }
-                // if closest_peak == peak, it is a definitive match
-                else {
-                    match->prev = current->peak;
-                    current->peak->next = match;
-                }
             }
-            current = current->next;
+
+            if(!p->next) {
+                last_unmatched = p;
+            }
+            node = node->next;
         }
     }
 
-    delete_peak_list(params->prev_peaks2);
-    params->prev_peaks2 = params->prev_peaks;
     params->prev_peaks = peak_list;
     return peak_list;
 }
+
+// ----------------------------------------------------------------------------
+// Export
+
+// Copy the peaks in peak_list to the given arrays, in list order. prev is set
+// to the index of the matching peak in the previous frame's peak list, or -1
+// if the peak has not been matched (or the list has not been tracked).
+// Returns the number of peaks, each array must have room for all of them.
+int get_peaks(PeakList* peak_list,
+              int num_amplitudes, sample* amplitudes,
+              int num_frequencies, sample* frequencies,
+              int num_phases, sample* phases,
+              int num_bins, int* bins,
+              int num_prev, int* prev) {
+    int num_peaks = 0;
+    PeakList* node = peak_list;
+    while(node && node->peak) {
+        num_peaks++;
+        node = node->next;
+    }
+
+    if(num_amplitudes < num_peaks || num_frequencies < num_peaks ||
+       num_phases < num_peaks || num_bins < num_peaks ||
+       num_prev < num_peaks) {
+        throw Exception(std::string("Peak arrays are too small: must be at ") +
+                        std::string("least the number of peaks"));
+    }
+
+    int i = 0;
+    node = peak_list;
+    while(node && node->peak) {
+        Peak* p = node->peak;
+        amplitudes[i] = p->amplitude;
+        frequencies[i] = p->frequency;
+        phases[i] = p->phase;
+        bins[i] = p->bin;
+        prev[i] = p->prev ? p->prev->index : -1;
+        i++;
+        node = node->next;
+    }
+    return num_peaks;
+}
@@ -1,17 +1,16 @@
 #ifndef _MQ_H
 #define _MQ_H
 
-#include <fftw3.h>
 #include <math.h>
+#include "precision.h"
 #include "detectionfunctions.h"
 
-typedef double sample;
-
 typedef struct Peak {
     float amplitude;
     float frequency;
     float phase;
     int bin;
+    int index;  // position in the peak list of its frame
     struct Peak* next;
     struct Peak* prev;
 } Peak;
@@ -31,20 +30,41 @@ typedef struct MQParameters {
     sample matching_interval;
     sample* window;
     sample* fft_in;
-	fftw_complex* fft_out;
-	fftw_plan fft_plan;
+	FFTW(complex)* fft_out;
+	FFTW(plan) fft_plan;
+    // Peaks are stored in memory that is allocated by init_mq and owned by
+    // the MQParameters. There is room for the peaks of two frames, each
+    // frame having up to max_frame_peaks peaks (the most that a spectrum of
+    // num_bins bins can have). Each call to find_peaks writes to the other
+    // half, so the peaks that it returns are valid until find_peaks is
+    // called twice more. If a frame is not passed to track_peaks, the frame
+    // after it can not be tracked.
+    int max_frame_peaks;
+    Peak* peaks;
+    PeakList* peak_nodes;
+    PeakList* found_peaks;  // the peaks returned by the last find_peaks
+    Peak** largest_peaks;  // scratch space for find_peaks
+    // scratch space for track_peaks
+    Peak** current_peaks;
+    int* unmatched_below;
+    int* unmatched_above;
     PeakList* prev_peaks;
-    PeakList* prev_peaks2;
 } MQParameters;
 
 int init_mq(MQParameters* params);
 void reset_mq(MQParameters* params);
 int destroy_mq(MQParameters* params);
-void delete_peak_list(PeakList* peak_list);
 
 PeakList* sort_peaks_by_frequency(PeakList* peak_list, int num_peaks);
 
 PeakList* find_peaks(int signal_size, sample* signal, MQParameters* params);
 PeakList* track_peaks(PeakList* peak_list, MQParameters* params);
+
+int get_peaks(PeakList* peak_list,
+              int num_amplitudes, sample* amplitudes,
+              int num_frequencies, sample* frequencies,
+              int num_phases, sample* phases,
+              int num_bins, int* bins,
+              int num_prev, int* prev);
                     
 #endif
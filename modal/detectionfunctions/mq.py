@@ -4,7 +4,17 @@
 import numpy as np
 
 
+# Peaks found in one frame, stored in a structured array
+peak_dtype = np.dtype([('amplitude', np.double),
+                       ('frequency', np.double),
+                       ('phase', np.double),
+                       ('bin_number', np.int32)])
+
+
 class Peak(object):
+    __slots__ = ['amplitude', 'frequency', 'phase', 'bin_number',
+                 'next_peak', 'prev_peak']
+
     def __init__(self):
         self.amplitude = 0.0
         self.frequency = 0.0
@@ -14,34 +24,17 @@ class Peak(object):
         self.prev_peak = None
 
 
-def compare_peak_amps(peak_x, peak_y):
-    '''
-    Compares two peaks, and returns 1, 0 or -1 if the first has a greater
-    amplitude than the second, they have the same amplitude, or the second has
-    a greater amplitude than the first respectively.
-    Can be used to sort lists of peaks.
-    '''
-    if peak_x.amplitude > peak_y.amplitude:
-        return 1
-    elif peak_x.amplitude < peak_y.amplitude:
-        return -1
-    else:
-        return 0
-
-
-def compare_peak_freqs(peak_x, peak_y):
-    '''
-    Compares two peaks, and returns 1, 0 or -1 if the first has a greater
-    frequency than the second, they have the same frequency, or the second has
-    a greater frequency than the first respectively.
-    Can be used to sort lists of peaks.
-    '''
-    if peak_x.frequency > peak_y.frequency:
-        return 1
-    elif peak_x.frequency < peak_y.frequency:
-        return -1
-    else:
-        return 0
+def array_to_peaks(peak_array):
+    'Return a list of Peak objects for a structured array of peaks.'
+    peaks = []
+    for amplitude, frequency, phase, bin_number in peak_array.tolist():
+        p = Peak()
+        p.amplitude = amplitude
+        p.frequency = frequency
+        p.phase = phase
+        p.bin_number = bin_number
+        peaks.append(p)
+    return peaks
 
 
 class MQPeakDetection(object):
@@ -60,93 +53,117 @@ class MQPeakDetection(object):
         self._fundamental = float(self._sampling_rate / self._window_size)
         self._peak_threshold = 0.1
 
-    def find_peaks(self, spectrum):
+    def find_peak_array(self, spectrum):
         '''
         Selects the highest peaks from the given spectral frame,
-        up to a maximum of self._max_peaks.
+        up to a maximum of self._max_peaks. Returns a structured array
+        of peaks (see peak_dtype), in frequency order.
         '''
-        peaks = []
-        prev_mag = np.abs(spectrum[0])
-        current_mag = np.abs(spectrum[1])
-        next_mag = 0.0
+        mags = np.abs(spectrum)
 
         # find all peaks in the spectrum
-        for bin in range(2, len(spectrum) - 1):
-            next_mag = np.abs(spectrum[bin])
-            if (current_mag > prev_mag and
-                current_mag > next_mag and
-                current_mag > self._peak_threshold):
-                p = Peak()
-                p.amplitude = current_mag
-                p.bin_number = bin - 1
-                p.frequency = (bin - 1) * self._fundamental
-                p.phase = np.angle(spectrum[bin - 1])
-                peaks.append(p)
-            prev_mag = current_mag
-            current_mag = next_mag
-
-        # sort peaks, largest amplitude first up to a max of self._max_peaks
-        peaks.sort(cmp=compare_peak_amps)
-        peaks.reverse()
-        if len(peaks) > self._max_peaks:
-            peaks = peaks[0:self._max_peaks]
-        # put back into frequency order
-        peaks.sort(cmp=compare_peak_freqs)
+        current_mags = mags[1:-2]
+        is_peak = ((current_mags > mags[0:-3]) &
+                   (current_mags > mags[2:-1]) &
+                   (current_mags > self._peak_threshold))
+        bins = np.flatnonzero(is_peak) + 1
+
+        # keep the largest peaks, up to a max of self._max_peaks. If there
+        # are several peaks with the same amplitude as the smallest peak that
+        # is kept, the highest frequency peaks are kept.
+        if self._max_peaks <= 0:
+            bins = bins[:0]
+        elif len(bins) > self._max_peaks:
+            amps = mags[bins]
+            num_smaller = len(amps) - self._max_peaks
+            smallest_amp = amps[np.argpartition(amps, num_smaller)
+                                [num_smaller]]
+            keep = amps > smallest_amp
+            num_equal = self._max_peaks - np.count_nonzero(keep)
+            equal = np.flatnonzero(amps == smallest_amp)
+            keep[equal[len(equal) - num_equal:]] = True
+            bins = bins[keep]
+
+        peaks = np.zeros(len(bins), dtype=peak_dtype)
+        peaks['amplitude'] = mags[bins]
+        peaks['frequency'] = bins * self._fundamental
+        peaks['phase'] = np.angle(spectrum[bins])
+        peaks['bin_number'] = bins
         return peaks
 
+    def find_peaks(self, spectrum):
+        '''
+        Selects the highest peaks from the given spectral frame,
+        up to a maximum of self._max_peaks. Returns a list of Peak objects,
+        in frequency order.
+        '''
+        return array_to_peaks(self.find_peak_array(spectrum))
+
+
+class _UnmatchedPeaks(object):
+    '''
+    The peaks in one frame that have not been matched yet, kept as a
+    doubly linked list over peak indices. Matched peaks keep their links,
+    which still point towards the unmatched peaks on either side.
+    '''
+    def __init__(self, num_peaks):
+        self.unmatched = [True] * num_peaks
+        self.below = range(-1, num_peaks - 1)
+        self.above = range(1, num_peaks + 1)
+
+    def closest(self, frequency, frequencies, position, matching_interval):
+        '''
+        Returns the index of the closest unmatched peak to frequency
+        that is within matching_interval, or -1. position is the index of
+        the first peak with a frequency that is not less than frequency.
+        If two peaks are equally close, the lower peak is returned.
+        '''
+        match = -1
+        min_distance = matching_interval
+        below = self.first_below(position - 1)
+        if below >= 0:
+            distance = abs(frequency - frequencies[below])
+            if distance < min_distance:
+                min_distance = distance
+                match = below
+        above = self.first_above(position)
+        if above < len(frequencies):
+            distance = abs(frequency - frequencies[above])
+            if distance < min_distance:
+                match = above
+        return match
+
+    def first_above(self, index):
+        'Index of the first unmatched peak at or above index (len if none).'
+        while index < len(self.unmatched) and not self.unmatched[index]:
+            index = self.above[index]
+        return index
+
+    def first_below(self, index):
+        'Index of the first unmatched peak at or below index (-1 if none).'
+        while index >= 0 and not self.unmatched[index]:
+            index = self.below[index]
+        return index
+
+    def remove(self, index):
+        self.unmatched[index] = False
+        below = self.below[index]
+        above = self.above[index]
+        if below >= 0:
+            self.above[below] = above
+        if above < len(self.unmatched):
+            self.below[above] = below
+
 
 class MQPartialTracking(object):
     'Partial tracking, based on the McAulay and Quatieri (MQ) algorithm'
     def __init__(self, max_peaks):
         self._max_peaks = max_peaks
         self._matching_interval = 200  # peak matching interval (in Hz)
+        self._prev_frequencies = None
         self._prev_peaks = None
 
-    def _find_closest_match(self, peak, frame, backwards_match=True):
-        '''
-        Find a candidate match for peak in frame if one exists.
-        This is the closest (in frequency) match that is within
-        self._matching_interval.
-        '''
-        match = None
-        free_peaks = []
-        for p in frame:
-            if backwards_match:
-                if not p.prev_peak:
-                    free_peaks.append(p)
-            else:
-                if not p.next_peak:
-                    free_peaks.append(p)
-
-        if free_peaks:
-            min_distance = self._matching_interval
-            match = None
-            for p in free_peaks:
-                distance = abs(peak.frequency - p.frequency)
-                if (distance < min_distance and
-                    distance < self._matching_interval):
-                    min_distance = distance
-                    match = p
-        return match
-
-    def _get_free_peak_below(self, peak, frame):
-        '''
-        Returns the closest unmatched peak in frame with a frequency less
-        than peak.frequency.
-        '''
-        # find peak in frame
-        for peak_number, p in enumerate(frame):
-            if p == peak:
-                # go back through lower peaks (in order) and return the
-                # first unmatched
-                current_peak = peak_number - 1
-                while current_peak >= 0:
-                    if not frame[current_peak].prev_peak:
-                        return frame[current_peak]
-                    current_peak -= 1
-        return None
-
-    def track_peaks(self, current_peaks):
+    def track_peak_array(self, peaks):
         '''
         1. If there is no peak within the matching interval, the track dies.
         If there is at least one peak within the matching interval, the
@@ -161,31 +178,74 @@ class MQPartialTracking(object):
         checked. If it is within the matching interval, it is selected as a
         definitive match. If not, the track dies.
         In any case, step 1 is repeated on the next unmatched peak.
+
+        peaks is a structured array of peaks (see peak_dtype) in frequency
+        order. Returns an array containing the index of the matching peak
+        in the previous frame for each peak, or -1 if the peak starts a new
+        partial.
+        '''
+        frequencies = np.array(peaks['frequency'], dtype=np.double)
+        prev_indices = np.empty(len(frequencies), dtype=np.intp)
+        prev_indices.fill(-1)
+
+        prev_frequencies = self._prev_frequencies
+        self._prev_frequencies = frequencies
+        self._prev_peaks = None
+        if (prev_frequencies is None or not len(prev_frequencies) or
+                not len(frequencies)):
+            return prev_indices
+
+        # for each peak, the position of the closest peaks in the other frame
+        positions = np.searchsorted(frequencies, prev_frequencies).tolist()
+        prev_positions = np.searchsorted(prev_frequencies,
+                                         frequencies).tolist()
+        current = frequencies.tolist()
+        prev = prev_frequencies.tolist()
+        unmatched = _UnmatchedPeaks(len(current))
+        prev_unmatched = _UnmatchedPeaks(len(prev))
+
+        for prev_index, frequency in enumerate(prev):
+            match = unmatched.closest(frequency, current,
+                                      positions[prev_index],
+                                      self._matching_interval)
+            if match < 0:
+                continue
+
+            # is this match closer to any of the other unmatched peaks
+            # in the previous frame?
+            closest_to_candidate = prev_unmatched.closest(
+                current[match], prev, prev_positions[match],
+                self._matching_interval
+            )
+            if not closest_to_candidate == prev_index:
+                # see if the closest peak with lower frequency to the
+                # candidate is within the matching interval
+                match = unmatched.first_below(match - 1)
+                if (match < 0 or abs(current[match] - frequency) >=
+                        self._matching_interval):
+                    continue
+            # if closest_to_candidate == prev_index, it is a definitive match
+            prev_indices[match] = prev_index
+            unmatched.remove(match)
+            prev_unmatched.remove(prev_index)
+
+        return prev_indices
+
+    def track_peaks(self, current_peaks):
+        '''
+        Matches a list of Peak objects to the peaks in the previous frame
+        (see track_peak_array), setting their prev_peak and next_peak links.
         '''
-        if self._prev_peaks:
-            # find all matches for peaks in self._prev_peaks in current frame
-            for peak in self._prev_peaks:
-                match = self._find_closest_match(peak, current_peaks)
-                if match:
-                    # is this match closer to any of the other unmatched peaks
-                    # in prev_peaks?
-                    closest_to_candidate = self._find_closest_match(
-                        match, self._prev_peaks, False
-                    )
-                    if not closest_to_candidate == peak:
-                        # see if the closest peak with lower frequency to the
-                        # candidate is within the matching interval
-                        lower_peak = self._get_free_peak_below(match,
-                                                               current_peaks)
-                        if lower_peak:
-                            if(abs(lower_peak.frequency - peak.frequency) <
-                               self._matching_interval):
-                                lower_peak.prev_peak = peak
-                                peak.next_peak = lower_peak
-                    # if closest_peak == peak, it is a definitive match
-                    else:
-                        match.prev_peak = peak
-                        peak.next_peak = match
+        prev_peaks = self._prev_peaks
+        peaks = np.zeros(len(current_peaks), dtype=peak_dtype)
+        peaks['frequency'] = [p.frequency for p in current_peaks]
+        prev_indices = self.track_peak_array(peaks)
+
+        if prev_peaks:
+            for peak, prev_index in zip(current_peaks, prev_indices):
+                if prev_index >= 0:
+                    peak.prev_peak = prev_peaks[prev_index]
+                    peak.prev_peak.next_peak = peak
 
         self._prev_peaks = current_peaks
         return current_peaks
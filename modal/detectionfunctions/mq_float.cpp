@@ -0,0 +1,3 @@
+// Single precision build of mq.cpp
+#define MODAL_SINGLE_PRECISION
+#include "mq.cpp"
@@ -18,6 +18,8 @@ audio /= np.max(audio)
 
 frame_size = 2048
 hop_size = 512
+# number of hops passed to the ODF in each call to process_frames
+buffer_hops = 16
 
 odf = modal.PeakAmpDifferenceODF()
 odf.set_frame_size(frame_size)
@@ -39,16 +41,18 @@ print "Total length:", float(len(audio)) / sampling_rate, "seconds"
 start_time = time.time()
 i = 0
 audio_pos = 0
+buffer_values = np.zeros(buffer_hops, dtype=np.double)
 while audio_pos <= len(audio) - odf.get_frame_size():
-    frame = audio[audio_pos:audio_pos + odf.get_frame_size()]
-    odf_value = odf.process_frame(frame)
-    odf_values.append(odf_value)
-    det_results = onset_det.is_onset(odf_value, return_threshold=True)
-    if det_results[0]:
-        onsets.append(i * odf.get_hop_size())
-    threshold.append(det_results[1])
-    audio_pos += odf.get_hop_size()
-    i += 1
+    num_values = odf.process_frames(audio, audio_pos, buffer_hops,
+                                    buffer_values)
+    for odf_value in buffer_values[:num_values]:
+        odf_values.append(odf_value)
+        det_results = onset_det.is_onset(odf_value, return_threshold=True)
+        if det_results[0]:
+            onsets.append(i * odf.get_hop_size())
+        threshold.append(det_results[1])
+        i += 1
+    audio_pos += num_values * odf.get_hop_size()
 run_time = time.time() - start_time
 
 print "Number of onsets detected:", len(onsets)
@@ -1,4 +1,5 @@
 import numpy as np
+from detectionfunctions.detectionfunctions import frames
 
 
 class ODFPeak(object):
@@ -28,6 +29,8 @@ class OnsetDetection(object):
         self.median_a = 0.1
         self.median_b = 1.0
         self.median_window = 9
+        # number of median windows to sort at once
+        self.median_block_size = 4096
         self.onset_location = self.ONSET_AT_PEAK
         # number of neighbouring samples on each side that a peak
         # must be larger than
@@ -38,19 +41,32 @@ class OnsetDetection(object):
         if not len(self.odf):
             return
 
-        self.threshold = np.zeros(len(self.odf))
-        for i in range(len(self.odf)):
-            # make sure we have enough signal either side of i to calculate the
-            # median threshold
-            start_sample = 0
-            end_sample = len(self.odf)
-            if i > (self.median_window / 2):
-                start_sample = i - (self.median_window / 2)
-            if i < len(self.odf) - (self.median_window / 2):
-                end_sample = i + (self.median_window / 2) + 1
-            median_samples = self.odf[start_sample:end_sample]
-            self.threshold[i] = self.median_a + (self.median_b *
-                                                 np.median(median_samples))
+        odf = np.asarray(self.odf)
+        half_window = self.median_window / 2
+        window_size = (2 * half_window) + 1
+        medians = np.zeros(len(odf))
+
+        # the median window is centred on each sample, so samples closer than
+        # half_window to either end use the part of the window that is
+        # inside the odf
+        edge_samples = range(min(half_window, len(odf)))
+        edge_samples += range(max(len(odf) - half_window, len(edge_samples)),
+                              len(odf))
+        for i in edge_samples:
+            start_sample = max(i - half_window, 0)
+            end_sample = i + half_window + 1
+            medians[i] = np.median(odf[start_sample:end_sample])
+
+        # all other samples have a complete (odd sized) window, so the median
+        # is the middle value. Windows are partitioned in blocks to limit the
+        # amount of memory that is used.
+        windows = frames(odf, window_size, 1)
+        for start in range(0, len(windows), self.median_block_size):
+            block = windows[start:start + self.median_block_size]
+            medians[start + half_window:start + half_window + len(block)] = \
+                np.partition(block, half_window, axis=1)[:, half_window]
+
+        self.threshold = self.median_a + (self.median_b * medians)
 
     def find_peaks(self):
         self.peaks = []
@@ -14,6 +14,7 @@ locations for ODF evaluation purposes. The database can be found in the
 downloads section, it is not included in the repository.
 The database is a hierarchical database, stored in the HDF5 format.
 '''
+import os
 from setuptools import setup, Extension
 
 try:
@@ -28,6 +29,14 @@ except ImportError:
 
 doc_lines = __doc__.split('\n')
 
+# Set MODAL_FAST_MATH=1 to build with -ffast-math, optimised for the CPU of
+# the build machine. The ODF loops (including sin, cos and atan2) can then
+# be vectorised, but results may differ slightly and the module may not run
+# on other machines.
+extra_compile_args = []
+if os.environ.get('MODAL_FAST_MATH'):
+    extra_compile_args = ['-O3', '-ffast-math', '-march=native']
+
 detectionfunctions = Extension(
     'modal/detectionfunctions/_pydetectionfunctions',
     sources=[
@@ -38,8 +47,25 @@ detectionfunctions = Extension(
     ],
     include_dirs=['src', numpy_include, '/usr/local/include',
                   '/opt/local/include'],
-    libraries=['m', 'fftw3'],
-    swig_opts=['-c++']
+    libraries=['m', 'pthread', 'fftw3'],
+    swig_opts=['-c++', '-Isrc'],
+    extra_compile_args=extra_compile_args
+)
+
+# single precision (float32) version of the detection functions
+detectionfunctions_float = Extension(
+    'modal/detectionfunctions/_pydetectionfunctions_float',
+    sources=[
+        'src/exceptions.cpp',
+        'modal/detectionfunctions/detectionfunctions_float.cpp',
+        'modal/detectionfunctions/mq_float.cpp',
+        'modal/detectionfunctions/detectionfunctions_float.i'
+    ],
+    include_dirs=['src', 'modal/detectionfunctions', numpy_include,
+                  '/usr/local/include', '/opt/local/include'],
+    libraries=['m', 'pthread', 'fftw3f'],
+    swig_opts=['-c++', '-Isrc'],
+    extra_compile_args=extra_compile_args
 )
 
 setup(
@@ -53,7 +79,7 @@ setup(
     author_email='john.c.glover@nuim.ie',
     platforms=['Linux', 'Mac OS-X', 'Unix', 'Windows'],
     version='1.11',
-    ext_modules=[detectionfunctions],
+    ext_modules=[detectionfunctions, detectionfunctions_float],
     packages=['modal', 'modal.db', 'modal.detectionfunctions',
               'modal.ui', 'modal.utils'],
     scripts=['bin/editonsets', 'bin/modalimport', 'bin/modalexport']
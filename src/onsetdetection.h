@@ -2,8 +2,7 @@
 #define _ONSETDETECTION_H
 
 #include <string.h>
-
-typedef double sample;
+#include "precision.h"
 
 sample mean(sample arr[], int n);
 sample median(sample arr[], int n);
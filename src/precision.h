@@ -0,0 +1,20 @@
+#ifndef _PRECISION_H
+#define _PRECISION_H
+
+#include <fftw3.h>
+
+// Modal uses double precision samples unless MODAL_SINGLE_PRECISION is
+// defined, in which case samples are floats and the single precision FFTW
+// library (fftw3f) is used.
+//
+// FFTW(name) expands to the FFTW function or type with the matching
+// precision, e.g. FFTW(complex) is fftw_complex or fftwf_complex.
+#ifdef MODAL_SINGLE_PRECISION
+typedef float sample;
+#define FFTW(name) fftwf_ ## name
+#else
+typedef double sample;
+#define FFTW(name) fftw_ ## name
+#endif
+
+#endif
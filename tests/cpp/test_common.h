@@ -6,11 +6,11 @@
 #include <sndfile.hh>
 
 #include "../../src/exceptions.h"
+#include "../../src/precision.h"
 
 namespace modal
 {
 
-typedef double sample;
 static const double PRECISION = 0.001;
 static const char* TEST_AUDIO_FILE = "../tests/audio/flute.wav";
 
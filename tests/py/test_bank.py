@@ -0,0 +1,91 @@
+import numpy as np
+from nose.tools import assert_almost_equals
+import modal
+
+df = modal.detectionfunctions.detectionfunctions
+
+
+class TestSpectralODFBank(object):
+    FLOAT_PRECISION = 5  # number of decimal places to check for accuracy
+    odf_classes = [df.SpectralDifferenceODF, df.ComplexODF,
+                   df.LPSpectralDifferenceODF, df.LPComplexODF,
+                   df.PeakAmpDifferenceODF]
+
+    def _bank(self, frame_size, hop_size):
+        bank = df.SpectralODFBank()
+        bank.set_frame_size(frame_size)
+        bank.set_hop_size(hop_size)
+        for odf_class in self.odf_classes:
+            bank.add_odf(odf_class.__name__, odf_class())
+        return bank
+
+    def test_bank_equal(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        audio = audio[0:8192]
+        frame_size = 512
+        hop_size = 256
+        bank = self._bank(frame_size, hop_size)
+        bank_samples = bank.process(audio)
+        assert len(bank_samples) == len(self.odf_classes)
+
+        odf_size = len(audio) / hop_size
+        for odf_class in self.odf_classes:
+            odf = odf_class()
+            odf.set_frame_size(frame_size)
+            odf.set_hop_size(hop_size)
+            samples = np.zeros(odf_size, dtype=np.double)
+            odf.process(audio, samples)
+            odf_samples = bank_samples[odf_class.__name__]
+            assert len(samples) == len(odf_samples)
+            for i in range(len(samples)):
+                assert_almost_equals(samples[i], odf_samples[i],
+                                     places=self.FLOAT_PRECISION)
+
+    def test_bank_equal_rt(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        audio = audio[0:8192]
+        frame_size = 256
+        hop_size = 128
+        bank = self._bank(frame_size, hop_size)
+        odfs = []
+        for odf_class in self.odf_classes:
+            odf = odf_class()
+            odf.set_frame_size(frame_size)
+            odf.set_hop_size(hop_size)
+            odfs.append(odf)
+
+        audio_pos = 0
+        while audio_pos <= len(audio) - frame_size:
+            frame = audio[audio_pos:audio_pos + frame_size]
+            bank_values = bank.process_frame(frame)
+            for odf in odfs:
+                assert_almost_equals(odf.process_frame(frame),
+                                     bank_values[odf.__class__.__name__],
+                                     places=self.FLOAT_PRECISION)
+            audio_pos += hop_size
+
+    def test_bank_process_frames(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        audio = audio[0:8192]
+        frame_size = 512
+        hop_size = 256
+        count = 10
+        bank = self._bank(frame_size, hop_size)
+        bank_values = {}
+        assert bank.process_frames(audio, 0, count, bank_values) == count
+        assert bank.process_frames(audio, count * hop_size, count,
+                                   bank_values) == count
+        assert len(bank_values) == len(self.odf_classes)
+
+        for odf_class in self.odf_classes:
+            odf = odf_class()
+            odf.set_frame_size(frame_size)
+            odf.set_hop_size(hop_size)
+            samples = np.zeros(count, dtype=np.double)
+            odf.process_frames(audio, 0, count, samples)
+            odf.process_frames(audio, count * hop_size, count, samples)
+            odf_samples = bank_values[odf_class.__name__]
+            assert len(odf_samples) == count
+            for i in range(count):
+                assert_almost_equals(samples[i], odf_samples[i],
+                                     places=self.FLOAT_PRECISION)
@@ -72,6 +72,59 @@ class TestComplexODFs(object):
                                  places=self.FLOAT_PRECISION)
             audio_pos += hop_size
 
+    def test_process_equals_process_frame(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        audio = audio[0:8192]
+        frame_size = 512
+        hop_size = 128
+        block_odf = ComplexODF()
+        block_odf.set_frame_size(frame_size)
+        block_odf.set_hop_size(hop_size)
+        block_odf.block_size = 7
+        rt_odf = ComplexODF()
+        rt_odf.set_frame_size(frame_size)
+        rt_odf.set_hop_size(hop_size)
+        # get odf samples
+        odf_size = len(audio) / hop_size
+        block_samples = np.zeros(odf_size, dtype=np.double)
+        block_odf.process(audio, block_samples)
+        rt_samples = np.zeros(odf_size, dtype=np.double)
+        audio_pos = 0
+        i = 0
+        while audio_pos <= len(audio) - frame_size:
+            frame = audio[audio_pos:audio_pos + frame_size]
+            rt_samples[i] = rt_odf.process_frame(frame)
+            audio_pos += hop_size
+            i += 1
+        rt_samples /= np.max(np.abs(rt_samples))
+
+        for i in range(len(block_samples)):
+            assert_almost_equals(block_samples[i], rt_samples[i],
+                                 places=self.FLOAT_PRECISION)
+
+    def test_phasor_prediction_equals_polar(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        # start with silence, so that some bins have no magnitude
+        audio = np.hstack((np.zeros(1024, dtype=np.double), audio[0:8192]))
+        frame_size = 512
+        hop_size = 128
+        polar_odf = CComplexODF()
+        polar_odf.set_frame_size(frame_size)
+        polar_odf.set_hop_size(hop_size)
+        phasor_odf = CComplexODF()
+        phasor_odf.set_frame_size(frame_size)
+        phasor_odf.set_hop_size(hop_size)
+        phasor_odf.set_phasor_prediction(True)
+        assert phasor_odf.get_phasor_prediction()
+        # get odf samples
+        audio_pos = 0
+        while audio_pos <= len(audio) - frame_size:
+            frame = audio[audio_pos:audio_pos + frame_size]
+            assert_almost_equals(polar_odf.process_frame(frame),
+                                 phasor_odf.process_frame(frame),
+                                 places=self.FLOAT_PRECISION)
+            audio_pos += hop_size
+
 
 class TestLPComplexODFs(object):
     FLOAT_PRECISION = 5  # number of decimal places to check for accuracy
@@ -72,6 +72,102 @@ class TestEnergyODFs(object):
                                  places=self.FLOAT_PRECISION)
             audio_pos += hop_size
 
+    def test_py_c_equal_overlapping(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        audio = audio[0:8192]
+        frame_size = 512
+        hop_size = 128
+        py_odf = EnergyODF()
+        py_odf.set_frame_size(frame_size)
+        py_odf.set_hop_size(hop_size)
+        py_odf.block_size = 7
+        c_odf = CEnergyODF()
+        c_odf.set_frame_size(frame_size)
+        c_odf.set_hop_size(hop_size)
+        # get odf samples
+        odf_size = len(audio) / hop_size
+        py_samples = np.zeros(odf_size, dtype=np.double)
+        c_samples = np.zeros(odf_size, dtype=np.double)
+        py_odf.process(audio, py_samples)
+        c_odf.process(audio, c_samples)
+
+        assert len(py_samples) == len(c_samples)
+        for i in range(len(py_samples)):
+            assert_almost_equals(py_samples[i], c_samples[i],
+                                 places=self.FLOAT_PRECISION)
+
+    def test_consecutive_frames_rt(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        audio = audio[0:8192]
+        frame_size = 256
+        hop_size = 96
+        odf = EnergyODF()
+        odf.set_frame_size(frame_size)
+        odf.set_hop_size(hop_size)
+        py_odf = EnergyODF()
+        py_odf.set_frame_size(frame_size)
+        py_odf.set_hop_size(hop_size)
+        py_odf.consecutive_frames = True
+        c_odf = CEnergyODF()
+        c_odf.set_frame_size(frame_size)
+        c_odf.set_hop_size(hop_size)
+        c_odf.set_consecutive_frames(True)
+        # get odf samples
+        audio_pos = 0
+        while audio_pos <= len(audio) - frame_size:
+            frame = audio[audio_pos:audio_pos + frame_size]
+            odf_value = odf.process_frame(frame)
+            py_odf_value = py_odf.process_frame(frame)
+            c_odf_value = c_odf.process_frame(frame)
+            assert_almost_equals(odf_value, py_odf_value,
+                                 places=self.FLOAT_PRECISION)
+            assert_almost_equals(odf_value, c_odf_value,
+                                 places=self.FLOAT_PRECISION)
+            audio_pos += hop_size
+
+    def test_coprime_frame_and_hop_sizes(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        audio = audio[0:8192]
+        for frame_size, hop_size in [(256, 255), (300, 77), (128, 300)]:
+            py_odf = EnergyODF()
+            py_odf.set_frame_size(frame_size)
+            py_odf.set_hop_size(hop_size)
+            c_odf = CEnergyODF()
+            c_odf.set_frame_size(frame_size)
+            c_odf.set_hop_size(hop_size)
+            # get odf samples
+            odf_size = len(audio) / hop_size
+            py_samples = np.zeros(odf_size, dtype=np.double)
+            c_samples = np.zeros(odf_size, dtype=np.double)
+            py_odf.process(audio, py_samples)
+            c_odf.process(audio, c_samples)
+            for i in range(len(py_samples)):
+                assert_almost_equals(py_samples[i], c_samples[i],
+                                     places=self.FLOAT_PRECISION)
+
+            odf = EnergyODF()
+            odf.set_frame_size(frame_size)
+            odf.set_hop_size(hop_size)
+            py_odf = EnergyODF()
+            py_odf.set_frame_size(frame_size)
+            py_odf.set_hop_size(hop_size)
+            py_odf.consecutive_frames = True
+            c_odf = CEnergyODF()
+            c_odf.set_frame_size(frame_size)
+            c_odf.set_hop_size(hop_size)
+            c_odf.set_consecutive_frames(True)
+            audio_pos = 0
+            while audio_pos <= len(audio) - frame_size:
+                frame = audio[audio_pos:audio_pos + frame_size]
+                odf_value = odf.process_frame(frame)
+                py_odf_value = py_odf.process_frame(frame)
+                c_odf_value = c_odf.process_frame(frame)
+                assert_almost_equals(odf_value, py_odf_value,
+                                     places=self.FLOAT_PRECISION)
+                assert_almost_equals(odf_value, c_odf_value,
+                                     places=self.FLOAT_PRECISION)
+                audio_pos += hop_size
+
 
 class TestLPEnergyODFs(object):
     audio_file = '../examples/audio/drums.wav'
@@ -135,3 +231,29 @@ class TestLPEnergyODFs(object):
             assert_almost_equals(py_odf_value, c_odf_value,
                                  places=self.FLOAT_PRECISION)
             audio_pos += hop_size
+
+    def test_py_c_equal_changed_order(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        audio = audio[0:8192]
+        frame_size = 512
+        hop_size = 256
+        order = 3
+        py_odf = LPEnergyODF()
+        py_odf.set_frame_size(frame_size)
+        py_odf.set_hop_size(hop_size)
+        py_odf.set_order(order)
+        c_odf = CLPEnergyODF()
+        c_odf.set_frame_size(frame_size)
+        c_odf.set_hop_size(hop_size)
+        c_odf.set_order(order)
+        # get odf samples
+        odf_size = len(audio) / hop_size
+        py_samples = np.zeros(odf_size, dtype=np.double)
+        c_samples = np.zeros(odf_size, dtype=np.double)
+        py_odf.process(audio, py_samples)
+        c_odf.process(audio, c_samples)
+
+        assert len(py_samples) == len(c_samples)
+        for i in range(len(py_samples)):
+            assert_almost_equals(py_samples[i], c_samples[i],
+                                 places=self.FLOAT_PRECISION)
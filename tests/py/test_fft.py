@@ -0,0 +1,126 @@
+import os
+import tempfile
+import threading
+import numpy as np
+from nose.tools import assert_almost_equals
+import modal.detectionfunctions.fft as fft
+import modal.detectionfunctions.pydetectionfunctions as cdf
+
+
+class TestFFT(object):
+    FLOAT_PRECISION = 8  # number of decimal places to check for accuracy
+
+    def test_window_cache(self):
+        w = fft.window(512)
+        assert w is fft.window(512)
+        assert w is not fft.window(512, fft.HAMMING)
+        assert not w.flags.writeable
+        assert np.all(w == np.hanning(512))
+
+    def test_backends_equal(self):
+        frames = np.random.random_sample((10, 256))
+        expected = np.fft.rfft(frames)
+        backend = fft.get_backend()
+        try:
+            for b in fft.available_backends():
+                fft.set_backend(b, 2)
+                assert fft.get_backend() == b
+                for i in range(2):
+                    spectra = fft.rfft(frames)
+                    spectrum = fft.rfft(frames[0])
+                assert spectra.shape == expected.shape
+                assert spectrum.shape == expected[0].shape
+                for s in range(len(frames)):
+                    for bin in range(expected.shape[1]):
+                        assert_almost_equals(spectra[s][bin].real,
+                                             expected[s][bin].real,
+                                             places=self.FLOAT_PRECISION)
+                        assert_almost_equals(spectra[s][bin].imag,
+                                             expected[s][bin].imag,
+                                             places=self.FLOAT_PRECISION)
+        finally:
+            fft.set_backend(backend)
+
+    def test_set_backend_in_other_thread(self):
+        if not fft.PYFFTW in fft.available_backends():
+            return
+        frames = np.random.random_sample((4, 256))
+        backend = fft.get_backend()
+        workers = fft.get_workers()
+        try:
+            fft.set_backend(fft.PYFFTW, 1)
+            fft.rfft(frames)
+            plan = fft._pyfftw_plan(frames.shape, frames.dtype)
+            # plans cached by this thread are replaced after set_backend is
+            # called in another thread
+            thread = threading.Thread(target=fft.set_backend,
+                                      args=(fft.PYFFTW, 2))
+            thread.start()
+            thread.join()
+            fft.rfft(frames)
+            assert fft._pyfftw_plan(frames.shape, frames.dtype) is not plan
+        finally:
+            fft.set_backend(backend, workers)
+
+    def test_plan_cache_size(self):
+        if not fft.PYFFTW in fft.available_backends():
+            return
+        backend = fft.get_backend()
+        workers = fft.get_workers()
+        try:
+            fft.set_backend(fft.PYFFTW, 1)
+            plan = fft._pyfftw_plan((1, 256), np.double)
+            for num_frames in range(2, fft._max_plans + 1):
+                fft._pyfftw_plan((num_frames, 256), np.double)
+            # the least recently used plan is discarded first
+            assert fft._pyfftw_plan((1, 256), np.double) is plan
+            fft._pyfftw_plan((fft._max_plans + 1, 256), np.double)
+            assert len(fft._plans.cache) == fft._max_plans
+            assert fft._pyfftw_plan((1, 256), np.double) is plan
+            assert (2, 256) not in [k[0] for k in fft._plans.cache]
+        finally:
+            fft.set_backend(backend, workers)
+
+
+class TestFFTPlanning(object):
+    FLOAT_PRECISION = 8  # number of decimal places to check for accuracy
+
+    def _process(self, odf, audio):
+        odf.set_frame_size(512)
+        odf.set_hop_size(256)
+        odf_values = np.zeros(len(audio) / 256, dtype=np.double)
+        odf.process(audio, odf_values)
+        return odf_values
+
+    def test_measured_plans_and_wisdom(self):
+        audio = np.random.random_sample(8192)
+        wisdom_file = os.path.join(tempfile.mkdtemp(), 'wisdom')
+        odfs = [cdf.SpectralDifferenceODF, cdf.ComplexODF,
+                cdf.LPSpectralDifferenceODF, cdf.LPComplexODF,
+                cdf.PeakAmpDifferenceODF]
+        expected = [self._process(odf(), audio) for odf in odfs]
+        try:
+            cdf.set_fft_wisdom_file(wisdom_file)
+            cdf.set_fft_planning_flag(cdf.FFT_MEASURE)
+            assert cdf.get_fft_planning_flag() == cdf.FFT_MEASURE
+            assert cdf.get_fft_wisdom_file() == wisdom_file
+            for odf, expected_values in zip(odfs, expected):
+                odf_values = self._process(odf(), audio)
+                for i in range(len(odf_values)):
+                    assert_almost_equals(odf_values[i], expected_values[i],
+                                         places=self.FLOAT_PRECISION)
+            assert os.path.exists(wisdom_file)
+            # plans already in the wisdom do not rewrite the file
+            inode = os.stat(wisdom_file).st_ino
+            self._process(odfs[0](), audio)
+            assert os.stat(wisdom_file).st_ino == inode
+            assert cdf.import_fft_wisdom(wisdom_file)
+            assert cdf.export_fft_wisdom(wisdom_file)
+            # temporary files are renamed to the wisdom file
+            assert os.listdir(os.path.dirname(wisdom_file)) == ['wisdom']
+        finally:
+            cdf.set_fft_planning_flag(cdf.FFT_ESTIMATE)
+            cdf.set_fft_wisdom_file('')
+            if os.path.exists(wisdom_file):
+                os.remove(wisdom_file)
+            os.rmdir(os.path.dirname(wisdom_file))
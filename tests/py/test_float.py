@@ -0,0 +1,47 @@
+import numpy as np
+from nose.tools import assert_almost_equals
+import modal
+import modal.detectionfunctions.pydetectionfunctions_float as pydf_float
+
+df = modal.detectionfunctions.detectionfunctions
+
+
+class TestSinglePrecision(object):
+    FLOAT_PRECISION = 3  # number of decimal places to check for accuracy
+    odfs = ['EnergyODF', 'SpectralDifferenceODF', 'ComplexODF',
+            'LPEnergyODF', 'LPSpectralDifferenceODF', 'LPComplexODF']
+
+    def _process(self, odf, audio, frame_size, hop_size):
+        odf.set_frame_size(frame_size)
+        odf.set_hop_size(hop_size)
+        odf_values = np.zeros(len(audio) / hop_size, dtype=audio.dtype)
+        odf.process(audio, odf_values)
+        return odf_values
+
+    def test_py_float_equals_double(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        audio = audio[0:8192]
+        audio_float = audio.astype(np.float32)
+        for name in self.odfs:
+            odf = getattr(df, name)()
+            values = self._process(odf, audio, 512, 256)
+            float_odf = getattr(df, name)()
+            float_odf.dtype = np.float32
+            float_values = self._process(float_odf, audio_float, 512, 256)
+            assert float_values.dtype == np.float32
+            for i in range(len(values)):
+                assert_almost_equals(values[i], float_values[i],
+                                     places=self.FLOAT_PRECISION)
+
+    def test_c_float_equals_double(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav',
+                                                            np.float32)
+        audio = audio[0:8192]
+        for name in self.odfs:
+            py_odf = getattr(df, name)()
+            values = self._process(py_odf, audio.astype(np.double), 512, 256)
+            c_odf = getattr(pydf_float, name)()
+            c_values = self._process(c_odf, audio, 512, 256)
+            for i in range(len(values)):
+                assert_almost_equals(values[i], c_values[i],
+                                     places=self.FLOAT_PRECISION)
@@ -4,9 +4,16 @@ import modal
 
 burg = modal.detectionfunctions.lp.burg
 predict = modal.detectionfunctions.lp.predict
+batch_burg = modal.detectionfunctions.lp.batch_burg
+batch_predict = modal.detectionfunctions.lp.batch_predict
 
 c_burg = modal.detectionfunctions.pydetectionfunctions.burg
 c_predict = modal.detectionfunctions.pydetectionfunctions.linear_prediction
+CBurgWorkspace = modal.detectionfunctions.pydetectionfunctions.BurgWorkspace
+c_init_burg_workspace = \
+    modal.detectionfunctions.pydetectionfunctions.init_burg_workspace
+c_destroy_burg_workspace = \
+    modal.detectionfunctions.pydetectionfunctions.destroy_burg_workspace
 
 
 class TestLinearPrediction(object):
@@ -28,6 +35,32 @@ class TestLinearPrediction(object):
                 assert_almost_equals(py_coefs[c], c_coefs[c],
                                      places=self.FLOAT_PRECISION)
 
+    def test_burg_workspace(self):
+        num_runs = 100
+        coefs = np.zeros(self.order)
+        workspace_coefs = np.zeros(self.order)
+        workspace = CBurgWorkspace()
+        c_init_burg_workspace(workspace, self.order, self.order)
+        try:
+            for i in range(num_runs):
+                # reusing the workspace should not change the coefficients
+                samples = (np.random.random_sample(self.order) * 2) - 1
+                c_burg(samples, self.order, coefs)
+                c_burg(samples, self.order, workspace_coefs, workspace)
+                for c in range(len(coefs)):
+                    assert_almost_equals(coefs[c], workspace_coefs[c],
+                                         places=self.FLOAT_PRECISION)
+            # signals larger than the workspace are rejected
+            samples = np.zeros(self.order + 1)
+            raised = False
+            try:
+                c_burg(samples, self.order, workspace_coefs, workspace)
+            except Exception:
+                raised = True
+            assert raised
+        finally:
+            c_destroy_burg_workspace(workspace)
+
     def test_predict_py_c_equal(self):
         num_runs = 100
         num_predictions = 5
@@ -46,3 +79,21 @@ class TestLinearPrediction(object):
             for c in range(len(py_predictions)):
                 assert_almost_equals(py_predictions[c], c_predictions[c],
                                      places=self.FLOAT_PRECISION)
+
+    def test_batch_burg_predict(self):
+        num_signals = 100
+        # create random signals, including one that is all zeros
+        signals = (np.random.random_sample((num_signals, self.order)) * 2) - 1
+        signals[0] = 0.0
+        coefs = batch_burg(signals, self.order)
+        predictions = batch_predict(signals, coefs)
+        assert coefs.shape == (num_signals, self.order)
+        assert len(predictions) == num_signals
+        for i in range(num_signals):
+            py_coefs = burg(signals[i], self.order)
+            py_prediction = predict(signals[i], py_coefs, 1)[0]
+            for c in range(len(py_coefs)):
+                assert_almost_equals(py_coefs[c], coefs[i][c],
+                                     places=self.FLOAT_PRECISION)
+            assert_almost_equals(py_prediction, predictions[i],
+                                 places=self.FLOAT_PRECISION)
@@ -29,7 +29,6 @@ class TestMQ(object):
         mq_params.fundamental = float(sampling_rate / frame_size)
         cdf.init_mq(mq_params)
         c_peaks = cdf.find_peaks(audio[0:frame_size], mq_params)
-        cdf.destroy_mq(mq_params)
 
         num_peaks = 0
         current_peak = c_peaks
@@ -42,20 +41,61 @@ class TestMQ(object):
         for i in range(len(py_peaks)):
             assert py_peaks[i] == current_peak.peak.bin
             current_peak = current_peak.next
-        cdf.delete_peak_list(c_peaks)
+        # the peaks belong to mq_params
+        cdf.destroy_mq(mq_params)
 
-    def test_track_peaks(self):
+    def test_find_peak_array(self):
         audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
-        frame_size = 1024
-        hop_size = 512
-        num_frames = 9
+        frame_size = 2048
         window = np.hanning(frame_size)
+        frame = audio[0:frame_size] * window
+        spectrum = np.fft.rfft(frame)
 
         pd = mq.MQPeakDetection(self.max_peaks, sampling_rate, frame_size)
-        pt = mq.MQPartialTracking(self.max_peaks)
+        peak_array = pd.find_peak_array(spectrum)
+        peaks = pd.find_peaks(spectrum)
+        assert len(peak_array) == len(peaks) == self.max_peaks
+
+        # peaks are in frequency order, and are the largest peaks
+        assert np.all(np.diff(peak_array['bin_number']) > 0)
+        mags = np.abs(spectrum)
+        for i in range(len(peaks)):
+            assert peak_array['bin_number'][i] == peaks[i].bin_number
+            assert_almost_equals(peak_array['amplitude'][i],
+                                 mags[peaks[i].bin_number],
+                                 places=self.FLOAT_PRECISION)
+            assert_almost_equals(peak_array['frequency'][i],
+                                 peaks[i].frequency,
+                                 places=self.FLOAT_PRECISION)
+        assert np.min(peak_array['amplitude']) >= np.max(
+            [mags[b] for b in range(1, len(mags) - 2)
+             if mags[b] > mags[b - 1] and mags[b] > mags[b + 1] and
+             b not in peak_array['bin_number']]
+        )
+
+    def test_find_peak_array_no_max_peaks(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        frame_size = 2048
+        window = np.hanning(frame_size)
+        frame = audio[0:frame_size] * window
+        spectrum = np.fft.rfft(frame)
+
+        pd = mq.MQPeakDetection(0, sampling_rate, frame_size)
+        peak_array = pd.find_peak_array(spectrum)
+        assert len(peak_array) == 0
+        assert peak_array.dtype == mq.peak_dtype
+        assert pd.find_peaks(spectrum) == []
+
+    def _track_peaks(self, max_peaks, frame_size, num_frames):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        hop_size = 512
+        window = np.hanning(frame_size)
+
+        pd = mq.MQPeakDetection(max_peaks, sampling_rate, frame_size)
+        pt = mq.MQPartialTracking(max_peaks)
 
         mq_params = cdf.MQParameters()
-        mq_params.max_peaks = self.max_peaks
+        mq_params.max_peaks = max_peaks
         mq_params.frame_size = frame_size
         mq_params.num_bins = int(frame_size / 2) + 1
         mq_params.peak_threshold = 0.1
@@ -88,3 +128,155 @@ class TestMQ(object):
                 current_peak = current_peak.next
 
         cdf.destroy_mq(mq_params)
+
+    def test_track_peaks(self):
+        self._track_peaks(self.max_peaks, 1024, 9)
+
+    def test_track_many_peaks(self):
+        self._track_peaks(100, 2048, 20)
+
+    def test_get_peaks(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        frame_size = 2048
+        hop_size = 512
+        max_peaks = 50
+
+        mq_params = cdf.MQParameters()
+        mq_params.max_peaks = max_peaks
+        mq_params.frame_size = frame_size
+        mq_params.num_bins = int(frame_size / 2) + 1
+        mq_params.peak_threshold = 0.1
+        mq_params.matching_interval = 200.0
+        mq_params.fundamental = float(sampling_rate / frame_size)
+        cdf.init_mq(mq_params)
+
+        amplitudes = np.zeros(max_peaks, dtype=np.double)
+        frequencies = np.zeros(max_peaks, dtype=np.double)
+        phases = np.zeros(max_peaks, dtype=np.double)
+        bins = np.zeros(max_peaks, dtype=np.int32)
+        prev = np.zeros(max_peaks, dtype=np.int32)
+        prev_frequencies = None
+
+        for i in range(20):
+            frame = audio[i * hop_size:(i * hop_size) + frame_size]
+            c_peaks = cdf.track_peaks(cdf.find_peaks(frame, mq_params),
+                                      mq_params)
+            num_peaks = cdf.get_peaks(c_peaks, amplitudes, frequencies,
+                                      phases, bins, prev)
+
+            current_peak = c_peaks
+            for p in range(num_peaks):
+                peak = current_peak.peak
+                assert_almost_equals(amplitudes[p], peak.amplitude,
+                                     places=self.FLOAT_PRECISION)
+                assert_almost_equals(frequencies[p], peak.frequency,
+                                     places=self.FLOAT_PRECISION)
+                assert_almost_equals(phases[p], peak.phase,
+                                     places=self.FLOAT_PRECISION)
+                assert bins[p] == peak.bin
+                if peak.prev:
+                    assert_almost_equals(prev_frequencies[prev[p]],
+                                         peak.prev.frequency,
+                                         places=self.FLOAT_PRECISION)
+                else:
+                    assert prev[p] == -1
+                current_peak = current_peak.next
+            assert not current_peak
+            prev_frequencies = frequencies[:num_peaks].copy()
+
+        # arrays must have room for all of the peaks
+        too_small = np.zeros(1, dtype=np.int32)
+        try:
+            cdf.get_peaks(c_peaks, amplitudes, frequencies, phases,
+                          bins, too_small)
+            assert False
+        except Exception, e:
+            assert 'too small' in str(e)
+        cdf.destroy_mq(mq_params)
+
+    def test_find_peaks_without_tracking(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        frame_size = 2048
+        hop_size = 512
+        frames = [audio[i * hop_size:(i * hop_size) + frame_size]
+                  for i in range(4)]
+
+        def init_params():
+            mq_params = cdf.MQParameters()
+            mq_params.max_peaks = self.max_peaks
+            mq_params.frame_size = frame_size
+            mq_params.num_bins = int(frame_size / 2) + 1
+            mq_params.peak_threshold = 0.1
+            mq_params.matching_interval = 200.0
+            mq_params.fundamental = float(sampling_rate / frame_size)
+            cdf.init_mq(mq_params)
+            return mq_params
+
+        def get_peaks(peak_list):
+            peaks = [np.zeros(self.max_peaks, dtype=np.double)
+                     for i in range(3)]
+            peaks += [np.zeros(self.max_peaks, dtype=np.int32)
+                      for i in range(2)]
+            num_peaks = cdf.get_peaks(peak_list, *peaks)
+            return [p[:num_peaks] for p in peaks]
+
+        # peaks are tracked against the last frame that was tracked
+        reference_params = init_params()
+        cdf.track_peaks(cdf.find_peaks(frames[2], reference_params),
+                        reference_params)
+        reference_peaks = get_peaks(cdf.track_peaks(
+            cdf.find_peaks(frames[3], reference_params), reference_params
+        ))
+        cdf.destroy_mq(reference_params)
+
+        mq_params = init_params()
+        cdf.track_peaks(cdf.find_peaks(frames[0], mq_params), mq_params)
+        untracked = cdf.find_peaks(frames[1], mq_params)
+        untracked_peaks = get_peaks(untracked)
+
+        # frame 1 was not tracked, so frame 2 can not be, but the peaks of
+        # frame 1 are still valid
+        peaks = get_peaks(cdf.track_peaks(cdf.find_peaks(frames[2],
+                                                         mq_params),
+                                          mq_params))
+        assert np.all(peaks[4] == -1)
+        for p1, p2 in zip(untracked_peaks, get_peaks(untracked)):
+            assert np.all(p1 == p2)
+
+        peaks = get_peaks(cdf.track_peaks(cdf.find_peaks(frames[3],
+                                                         mq_params),
+                                          mq_params))
+        for p1, p2 in zip(reference_peaks, peaks):
+            assert np.all(p1 == p2)
+        cdf.destroy_mq(mq_params)
+
+    def test_track_peak_array(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        frame_size = 2048
+        hop_size = 512
+        window = np.hanning(frame_size)
+
+        pd = mq.MQPeakDetection(self.max_peaks, sampling_rate, frame_size)
+        array_pt = mq.MQPartialTracking(self.max_peaks)
+        pt = mq.MQPartialTracking(self.max_peaks)
+        prev_peak_array = None
+
+        for i in range(20):
+            frame = audio[i * hop_size:(i * hop_size) + frame_size]
+            spectrum = np.fft.rfft(frame * window)
+
+            peak_array = pd.find_peak_array(spectrum)
+            prev_indices = array_pt.track_peak_array(peak_array)
+            peaks = pt.track_peaks(pd.find_peaks(spectrum))
+
+            assert len(prev_indices) == len(peaks)
+            for peak, prev_index in zip(peaks, prev_indices):
+                if peak.prev_peak:
+                    assert_almost_equals(
+                        peak.prev_peak.frequency,
+                        prev_peak_array['frequency'][prev_index],
+                        places=self.FLOAT_PRECISION
+                    )
+                else:
+                    assert prev_index == -1
+            prev_peak_array = peak_array
@@ -0,0 +1,28 @@
+import numpy as np
+from nose.tools import assert_almost_equals
+import modal
+
+
+class TestOnsetDetection(object):
+    FLOAT_PRECISION = 5  # number of decimal places to check for accuracy
+
+    def test_median_threshold(self):
+        odf = np.random.RandomState(0).rand(1000)
+        for median_window in [1, 4, 9, 25]:
+            od = modal.OnsetDetection()
+            od.odf = odf
+            od.median_window = median_window
+            od.median_block_size = 100
+            od._calculate_median_threshold()
+
+            # median of the window centred on each sample, truncated at
+            # the edges of the odf
+            half_window = median_window / 2
+            assert len(od.threshold) == len(odf)
+            for i in range(len(odf)):
+                start = max(i - half_window, 0)
+                end = i + half_window + 1
+                threshold = od.median_a + (od.median_b *
+                                           np.median(odf[start:end]))
+                assert_almost_equals(od.threshold[i], threshold,
+                                     places=self.FLOAT_PRECISION)
@@ -6,6 +6,16 @@ PeakAmpDifferenceODF = \
     modal.detectionfunctions.detectionfunctions.PeakAmpDifferenceODF
 CPeakAmpDifferenceODF = \
     modal.detectionfunctions.pydetectionfunctions.PeakAmpDifferenceODF
+PeakODF = modal.detectionfunctions.detectionfunctions.PeakODF
+
+
+class PeakAmpDistanceODF(PeakODF):
+    'PeakAmpDifferenceODF, only implementing get_distance'
+    def get_distance(self, peak1, peak2):
+        if not peak2:
+            return peak1.amplitude
+        else:
+            return np.abs(peak1.amplitude - peak2.amplitude)
 
 
 class TestPeakAmpDifferenceODF(object):
@@ -71,3 +81,21 @@ class TestPeakAmpDifferenceODF(object):
             assert_almost_equals(py_odf_value, c_odf_value,
                                  places=self.FLOAT_PRECISION)
             audio_pos += hop_size
+
+    def test_get_distance(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        audio = audio[0:8192]
+        frame_size = 512
+        hop_size = 256
+        odfs = [PeakAmpDifferenceODF(), PeakAmpDistanceODF()]
+        for odf in odfs:
+            odf.set_frame_size(frame_size)
+            odf.set_hop_size(hop_size)
+            odf.set_max_peaks(self.max_peaks)
+        audio_pos = 0
+        while audio_pos <= len(audio) - frame_size:
+            frame = audio[audio_pos:audio_pos + frame_size]
+            assert_almost_equals(odfs[0].process_frame(frame),
+                                 odfs[1].process_frame(frame),
+                                 places=self.FLOAT_PRECISION)
+            audio_pos += hop_size
@@ -0,0 +1,71 @@
+import numpy as np
+from nose.tools import assert_almost_equals
+import modal
+
+df = modal.detectionfunctions.detectionfunctions
+cdf = modal.detectionfunctions.pydetectionfunctions
+
+
+class TestProcessFrames(object):
+    FLOAT_PRECISION = 5  # number of decimal places to check for accuracy
+    PEAK_FLOAT_PRECISION = 3  # C++ peaks are single precision
+    max_peaks = 10
+    odfs = ['EnergyODF', 'SpectralDifferenceODF', 'ComplexODF',
+            'LPEnergyODF', 'LPSpectralDifferenceODF', 'LPComplexODF',
+            'PeakAmpDifferenceODF']
+
+    def _odf(self, module, name, frame_size, hop_size):
+        odf = getattr(module, name)()
+        odf.set_frame_size(frame_size)
+        odf.set_hop_size(hop_size)
+        if hasattr(odf, 'set_max_peaks'):
+            odf.set_max_peaks(self.max_peaks)
+        return odf
+
+    def test_process_frames_equals_process_frame(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        audio = audio[0:8192]
+        frame_size = 512
+        hop_size = 128
+        num_frames = ((len(audio) - frame_size) / hop_size) + 1
+        # process frames in irregularly sized groups, with a count that goes
+        # past the end of the signal
+        counts = [1, 7, 20, 3, 100]
+        for module in [df, cdf]:
+            for name in self.odfs:
+                odf = self._odf(module, name, frame_size, hop_size)
+                rt_odf = self._odf(module, name, frame_size, hop_size)
+                values = np.zeros(num_frames, dtype=np.double)
+                i = 0
+                for count in counts:
+                    frame_values = np.zeros(count, dtype=np.double)
+                    n = odf.process_frames(audio, i * hop_size, count,
+                                           frame_values)
+                    assert n == min(count, num_frames - i)
+                    values[i:i + n] = frame_values[:n]
+                    i += n
+                assert i == num_frames
+
+                for i in range(num_frames):
+                    start = i * hop_size
+                    frame = audio[start:start + frame_size]
+                    assert_almost_equals(values[i],
+                                         rt_odf.process_frame(frame),
+                                         places=self.FLOAT_PRECISION)
+
+    def test_process_frames_py_c_equal(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        audio = audio[0:8192]
+        count = 10
+        for name in self.odfs:
+            py_odf = self._odf(df, name, 512, 256)
+            c_odf = self._odf(cdf, name, 512, 256)
+            py_values = np.zeros(count, dtype=np.double)
+            c_values = np.zeros(count, dtype=np.double)
+            assert py_odf.process_frames(audio, 1000, count, py_values) == \
+                c_odf.process_frames(audio, 1000, count, c_values)
+            places = self.FLOAT_PRECISION
+            if hasattr(py_odf, 'set_max_peaks'):
+                places = self.PEAK_FLOAT_PRECISION
+            for i in range(count):
+                assert_almost_equals(py_values[i], c_values[i], places=places)
@@ -0,0 +1,111 @@
+import numpy as np
+import scipy.signal
+from nose.tools import assert_almost_equals
+import modal
+
+df = modal.detectionfunctions.detectionfunctions
+
+
+class TestSmoothing(object):
+    FLOAT_PRECISION = 5  # number of decimal places to check for accuracy
+
+    def _centred_average(self, signal, coefs):
+        # smooth signal one window at a time
+        result = np.zeros(signal.size)
+        n = len(coefs) / 2
+        for centre in range(n, signal.size - n):
+            window = signal[centre - n:centre + n + 1]
+            result[centre] = np.sum(window * coefs) / np.sum(coefs)
+        return result
+
+    def test_moving_average(self):
+        signal = np.random.random_sample(100)
+        expected = self._centred_average(signal, np.ones(7))
+        smoothed = df.moving_average(signal, 6)
+        assert len(smoothed) == len(expected)
+        for i in range(len(smoothed)):
+            assert_almost_equals(smoothed[i], expected[i],
+                                 places=self.FLOAT_PRECISION)
+
+    def test_savitzky_golay(self):
+        signal = np.random.random_sample(100)
+        coefs = np.array([-2, 3, 6, 7, 6, 3, -2])
+        expected = self._centred_average(signal, coefs)
+        smoothed = df.savitzky_golay(signal, 7)
+        assert len(smoothed) == len(expected)
+        for i in range(len(smoothed)):
+            assert_almost_equals(smoothed[i], expected[i],
+                                 places=self.FLOAT_PRECISION)
+
+    def test_lpf_short_signal(self):
+        for size in [1, 40, 100, 101, 102, 300]:
+            signal = np.random.random_sample(size)
+            smoothed = df.lpf(signal, 101, 0.075)
+            assert len(smoothed) == size
+            if size >= 101:
+                expected = np.convolve(signal,
+                                       scipy.signal.firwin(101, 0.075),
+                                       'same')
+                for i in range(size):
+                    assert_almost_equals(smoothed[i], expected[i],
+                                         places=self.FLOAT_PRECISION)
+
+        # process smooths ODFs that are shorter than the filter
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        audio = audio[0:40 * 128]
+        odf = df.SpectralDifferenceODF()
+        odf.set_frame_size(512)
+        odf.set_hop_size(128)
+        odf.smooth_type = df.OnsetDetectionFunction.SMOOTH_LPF
+        odf_values = np.zeros(len(audio) / 128, dtype=np.double)
+        odf.process(audio, odf_values)
+        assert len(odf.det_func) == 40
+
+    def test_process_and_rt_smoothing(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        audio = audio[0:8192]
+        frame_size = 512
+        hop_size = 128
+        smooth_types = [df.OnsetDetectionFunction.SMOOTH_MOVING_AVERAGE,
+                        df.OnsetDetectionFunction.SMOOTH_SAVITZKY_GOLAY,
+                        df.OnsetDetectionFunction.SMOOTH_LPF]
+        for smooth_type in smooth_types:
+            odf = df.SpectralDifferenceODF()
+            odf.set_frame_size(frame_size)
+            odf.set_hop_size(hop_size)
+            odf.smooth_type = smooth_type
+            odf.lpf_order = 11
+            odf_size = len(audio) / hop_size
+            odf_values = np.zeros(odf_size, dtype=np.double)
+            odf.process(audio, odf_values)
+
+            # calculate unsmoothed and smoothed values one frame at a time
+            rt_odf = df.SpectralDifferenceODF()
+            rt_odf.set_frame_size(frame_size)
+            rt_odf.set_hop_size(hop_size)
+            smoother = odf.smoother()
+            values = np.zeros(odf_size, dtype=np.double)
+            rt_values = np.zeros(odf_size, dtype=np.double)
+            audio_pos = 0
+            i = 0
+            while audio_pos <= len(audio) - frame_size:
+                frame = audio[audio_pos:audio_pos + frame_size]
+                values[i] = rt_odf.process_frame(frame)
+                rt_values[i] = smoother.smooth(values[i])
+                audio_pos += hop_size
+                i += 1
+            num_frames = i
+
+            # process should smooth before normalising
+            smoothed = odf._smooth(values)
+            smoothed /= np.max(np.abs(smoothed))
+            for i in range(odf_size):
+                assert_almost_equals(odf_values[i], smoothed[i],
+                                     places=self.FLOAT_PRECISION)
+
+            # streaming values are delayed, and differ only at the edges
+            smoothed = odf._smooth(values)
+            for i in range(len(smoother.coefs), num_frames - smoother.delay):
+                assert_almost_equals(smoothed[i],
+                                     rt_values[i + smoother.delay],
+                                     places=self.FLOAT_PRECISION)
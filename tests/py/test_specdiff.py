@@ -72,6 +72,36 @@ class TestODFs(object):
                                  places=self.FLOAT_PRECISION)
             audio_pos += hop_size
 
+    def test_process_equals_process_frame(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        audio = audio[0:8192]
+        frame_size = 512
+        hop_size = 128
+        block_odf = SpectralDifferenceODF()
+        block_odf.set_frame_size(frame_size)
+        block_odf.set_hop_size(hop_size)
+        block_odf.block_size = 7
+        rt_odf = SpectralDifferenceODF()
+        rt_odf.set_frame_size(frame_size)
+        rt_odf.set_hop_size(hop_size)
+        # get odf samples
+        odf_size = len(audio) / hop_size
+        block_samples = np.zeros(odf_size, dtype=np.double)
+        block_odf.process(audio, block_samples)
+        rt_samples = np.zeros(odf_size, dtype=np.double)
+        audio_pos = 0
+        i = 0
+        while audio_pos <= len(audio) - frame_size:
+            frame = audio[audio_pos:audio_pos + frame_size]
+            rt_samples[i] = rt_odf.process_frame(frame)
+            audio_pos += hop_size
+            i += 1
+        rt_samples /= np.max(np.abs(rt_samples))
+
+        for i in range(len(block_samples)):
+            assert_almost_equals(block_samples[i], rt_samples[i],
+                                 places=self.FLOAT_PRECISION)
+
 
 class TestLPODFs(object):
     FLOAT_PRECISION = 5  # number of decimal places to check for accuracy
@@ -0,0 +1,125 @@
+import threading
+import numpy as np
+from nose.tools import assert_almost_equals
+import modal
+
+cdf = modal.detectionfunctions.pydetectionfunctions
+
+
+class TestThreads(object):
+    FLOAT_PRECISION = 5  # number of decimal places to check for accuracy
+    num_threads = 4
+    odfs = ['EnergyODF', 'SpectralDifferenceODF', 'ComplexODF',
+            'LPEnergyODF', 'LPSpectralDifferenceODF', 'LPComplexODF',
+            'PeakAmpDifferenceODF']
+
+    def _odf(self, name, frame_size, hop_size):
+        odf = getattr(cdf, name)()
+        odf.set_frame_size(frame_size)
+        odf.set_hop_size(hop_size)
+        return odf
+
+    def test_threaded_process_equals_serial(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        audio = audio[0:16384]
+        frame_size = 512
+        hop_size = 256
+        num_values = len(audio) / hop_size
+        for name in self.odfs:
+            odf = self._odf(name, frame_size, hop_size)
+            values = np.zeros(num_values, dtype=np.double)
+            odf.process(audio, values)
+
+            # one ODF per thread, all created on this thread as FFTW
+            # planning is not thread safe
+            thread_odfs = [self._odf(name, frame_size, hop_size)
+                           for i in range(self.num_threads)]
+            thread_values = [np.zeros(num_values, dtype=np.double)
+                             for i in range(self.num_threads)]
+            threads = [threading.Thread(target=thread_odfs[i].process,
+                                        args=(audio, thread_values[i]))
+                       for i in range(self.num_threads)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            for t in range(self.num_threads):
+                for i in range(num_values):
+                    assert_almost_equals(values[i], thread_values[t][i],
+                                         places=self.FLOAT_PRECISION)
+
+    def test_num_threads_equals_serial(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        audio = audio[0:16384]
+        frame_size = 512
+        hop_size = 256
+        num_values = len(audio) / hop_size
+        # another frame is processed after process, to check that the ODF
+        # is left in the same state
+        frame = audio[4096:4096 + frame_size]
+        for name in self.odfs:
+            odf = self._odf(name, frame_size, hop_size)
+            values = np.zeros(num_values, dtype=np.double)
+            odf.process(audio, values)
+            next_value = odf.process_frame(frame)
+
+            for num_threads in [2, 3, self.num_threads]:
+                threaded_odf = self._odf(name, frame_size, hop_size)
+                threaded_odf.set_num_threads(num_threads)
+                threaded_values = np.zeros(num_values, dtype=np.double)
+                threaded_odf.process(audio, threaded_values)
+                for i in range(num_values):
+                    assert_almost_equals(values[i], threaded_values[i],
+                                         places=self.FLOAT_PRECISION)
+                assert_almost_equals(next_value,
+                                     threaded_odf.process_frame(frame),
+                                     places=self.FLOAT_PRECISION)
+
+    def test_concurrent_threaded_process(self):
+        audio, sampling_rate, onsets = modal.get_audio_file('piano_G2.wav')
+        audio = audio[0:16384]
+        frame_size = 512
+        hop_size = 256
+        num_values = len(audio) / hop_size
+        num_runs = 5
+        for name in self.odfs:
+            odf = self._odf(name, frame_size, hop_size)
+            values = np.zeros(num_values, dtype=np.double)
+            odf.process(audio, values)
+
+            # each Python thread creates, resizes and processes its own
+            # threaded ODFs, so FFTs are planned and destroyed concurrently
+            thread_values = [[] for i in range(self.num_threads)]
+
+            def run(results):
+                for i in range(num_runs):
+                    thread_odf = self._odf(name, 1024, hop_size)
+                    thread_odf.set_frame_size(frame_size)
+                    thread_odf.set_num_threads(self.num_threads)
+                    result = np.zeros(num_values, dtype=np.double)
+                    thread_odf.process(audio, result)
+                    results.append(result)
+
+            threads = [threading.Thread(target=run, args=(thread_values[i],))
+                       for i in range(self.num_threads)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            for t in range(self.num_threads):
+                assert len(thread_values[t]) == num_runs
+                for result in thread_values[t]:
+                    for i in range(num_values):
+                        assert_almost_equals(values[i], result[i],
+                                             places=self.FLOAT_PRECISION)
+
+    def test_clone(self):
+        for name in self.odfs:
+            odf = self._odf(name, 1024, 128)
+            odf.set_sampling_rate(48000)
+            clone = odf.clone()
+            assert clone.get_frame_size() == 1024
+            assert clone.get_hop_size() == 128
+            assert clone.get_sampling_rate() == 48000